@@ -0,0 +1,105 @@
+# benchmarks/bench_placeholders.py
+"""
+Micro-benchmark of command output rendering: the previous per-placeholder
+str.replace loop against the compiled template renderer.
+
+Run from the repository root:
+    python benchmarks/bench_placeholders.py
+"""
+import os
+import random
+import re
+import sys
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PLACEHOLDERS
+from placeholders import RenderContext, resolve_placeholder
+from utils import replace_placeholders
+
+def make_ctx():
+    """
+    Builds a stand-in for discord.Interaction with the attributes the
+    placeholders read.
+    """
+    member = SimpleNamespace(
+        joined_at=datetime(2021, 3, 4, 5, 6, 7),
+        roles=[SimpleNamespace(name=name) for name in ("@everyone", "Member", "Orange", "Helper")],
+        status="online",
+    )
+    user = SimpleNamespace(
+        name="orange", id=123456789012345678, mention="<@123456789012345678>",
+        avatar=SimpleNamespace(url="https://cdn.example/avatar.png"), discriminator="0",
+        created_at=datetime(2020, 1, 2, 3, 4, 5),
+    )
+    guild = SimpleNamespace(
+        name="Orange Squad", id=876543210987654321, member_count=1234,
+        icon=None, banner=None, description="A server", owner=SimpleNamespace(name="owner"),
+        created_at=datetime(2019, 6, 7, 8, 9, 10), premium_subscription_count=14,
+        get_member=lambda user_id: member,
+    )
+    channel = SimpleNamespace(name="general", id=192837465564738291)
+    return SimpleNamespace(user=user, guild=guild, channel=channel, id=111222333444555666)
+
+def legacy_render(output, ctx, params, command):
+    """
+    The rendering loop used before templates were compiled: one substring
+    scan per known placeholder, a str.replace per placeholder found, and a
+    re.sub per argument occurrence.
+    """
+    render = RenderContext(ctx, params, command)
+    for group in ("[]", "{}", "<>"):
+        for placeholder in PLACEHOLDERS[group]["placeholders"]:
+            if placeholder in output:
+                output = output.replace(placeholder, resolve_placeholder(placeholder, render))
+    for arg_name in re.findall(r"\{\[\<(\w+)\>\]\}", output):
+        value = params.get(arg_name, "")
+        output = re.sub(r"\{\[\<" + re.escape(arg_name) + r"\>\]\}", value.strip(), output)
+    return output
+
+TEMPLATES = {
+    "plain": "Welcome to the server! Read the rules and have fun. " * 4,
+    "few": "Hello [user_mention], welcome to {servername}! You are member #{member_count}.",
+    "many": (
+        "[username] ([user_id]) joined {servername} at [user_joined_at] with roles [user_roles]. "
+        "Status: [user_status]. Server {server_id} created {server_created_at}, owned by {server_owner}, "
+        "{server_boosts} boosts. Channel <channel_name> (<channel_id>) at <current_date> <current_time>. "
+        "Args: {[<first>]} {[<second>]} {[<first>]}"
+    ),
+}
+
+def run_to_completion(coroutine):
+    """
+    Drives a coroutine that never suspends (no Orange Bank fields) without
+    an event loop, so loop overhead does not blur the comparison.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as finished:
+        return finished.value
+    raise RuntimeError("render suspended; benchmark templates must not use ob_ fields")
+
+def main(number=20000):
+    ctx = make_ctx()
+    params = {"first": "alpha", "second": " beta "}
+    command = {}
+
+    def compiled_render(output):
+        return run_to_completion(replace_placeholders(output, ctx, params, None, command))
+
+    print(f"{'template':<10} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    for label, output in TEMPLATES.items():
+        random.seed(0)
+        expected = legacy_render(output, ctx, params, command)
+        random.seed(0)
+        assert compiled_render(output) == expected, f"output differs for {label!r}"
+
+        legacy = min(timeit.repeat(lambda: legacy_render(output, ctx, params, command), number=number, repeat=3))
+        compiled = min(timeit.repeat(lambda: compiled_render(output), number=number, repeat=3))
+        print(f"{label:<10} {legacy / number * 1e6:10.2f} {compiled / number * 1e6:12.2f} {legacy / compiled:7.1f}x")
+
+if __name__ == "__main__":
+    main()
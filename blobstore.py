@@ -0,0 +1,157 @@
+# blobstore.py
+
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter
+import time
+from config import BLOBS_DIR
+
+logger = logging.getLogger('CustomCommandBot')
+
+# Blobs handed out by stage() but not yet on disk; served from memory until written
+_staged = {}  # hash -> bytes
+_lock = threading.Lock()
+
+def blob_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+def _blob_path(digest):
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+def stage(content: bytes) -> str:
+    """
+    Registers ``content`` for writing and returns its hash. Identical content
+    always maps to the same blob, so copies are stored once.
+    """
+    digest = blob_hash(content)
+    with _lock:
+        _staged.setdefault(digest, content)
+    return digest
+
+def write_staged():
+    """
+    Writes every staged blob that is not on disk yet. Called from the flusher
+    thread before the trees that reference the blobs are written.
+    """
+    with _lock:
+        items = list(_staged.items())
+    for digest, content in items:
+        path = _blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        else:
+            # Reused content counts as new for collect_garbage()'s grace period
+            os.utime(path)
+        with _lock:
+            _staged.pop(digest, None)
+
+def get(digest: str) -> bytes:
+    with _lock:
+        content = _staged.get(digest)
+    if content is not None:
+        return content
+    try:
+        with open(_blob_path(digest), "rb") as f:
+            return f.read()
+    except OSError as e:
+        logger.error(f"Failed to read blob {digest}: {e}")
+        return b''
+
+def stored_blobs():
+    """
+    Returns the hashes of every blob on disk.
+    """
+    if not os.path.isdir(BLOBS_DIR):
+        return set()
+    digests = set()
+    for prefix in os.listdir(BLOBS_DIR):
+        prefix_dir = os.path.join(BLOBS_DIR, prefix)
+        if os.path.isdir(prefix_dir):
+            digests.update(name for name in os.listdir(prefix_dir) if not name.endswith(".tmp"))
+    return digests
+
+class BlobReferences:
+    """
+    Counts how many owners' saved state (snapshot plus log) references each
+    blob. Updated on the flusher thread as snapshots and log entries are
+    written; blobs whose count drops to zero become candidates for
+    collect_garbage(), so a sweep never has to look at every owner.
+    """
+
+    def __init__(self):
+        self._by_owner = {}  # owner -> set of hashes
+        self._counts = Counter()
+        self.candidates = set()  # Hashes no owner references any more
+
+    def replace(self, owner, digests):
+        """
+        Records that ``owner`` now references exactly ``digests`` (a snapshot was written).
+        """
+        old = self._by_owner.get(owner, set())
+        for digest in old - digests:
+            self._counts[digest] -= 1
+            if self._counts[digest] <= 0:
+                del self._counts[digest]
+                self.candidates.add(digest)
+        self._add(digests - old)
+        self._by_owner[owner] = set(digests)
+
+    def add(self, owner, digests):
+        """
+        Records new references of ``owner`` (log entries were appended).
+        """
+        owned = self._by_owner.setdefault(owner, set())
+        new = set(digests) - owned
+        owned.update(new)
+        self._add(new)
+
+    def _add(self, digests):
+        for digest in digests:
+            self._counts[digest] += 1
+            self.candidates.discard(digest)
+
+    def digests(self):
+        """
+        Returns the hashes referenced by at least one owner.
+        """
+        return set(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+def collect_garbage(references, grace):
+    """
+    Deletes the candidate blobs of ``references`` that are not staged and
+    were not written in the last ``grace`` seconds. The grace period covers
+    blobs written for a log entry that has not been appended yet; candidates
+    still inside it are checked again on the next sweep. Must run on the
+    flusher thread so no references change meanwhile. Returns (blobs, bytes) removed.
+    """
+    cutoff = time.time() - grace
+    removed = freed = 0
+    for digest in list(references.candidates):
+        with _lock:
+            if digest in _staged:
+                continue
+        path = _blob_path(digest)
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            references.candidates.discard(digest)
+            continue
+        except OSError as e:
+            logger.warning(f"Failed to remove blob {digest}: {e}")
+            continue
+        references.candidates.discard(digest)
+        removed += 1
+        freed += stat.st_size
+    return removed, freed
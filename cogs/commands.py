@@ -6,27 +6,58 @@ from discord import Embed
 from modals import CreateCommandModal
 from views import ManageCommandsView, SelectDuplicateCommandView
 from utils import replace_placeholders
-from data import load_commands, save_commands
+from data import load_commands, save_commands, find_public_commands, count_global_public_commands
+from command_index import user_commands
 import logging
 import json
 import os
 from discord.ui import Select, View
 from datetime import datetime
+import asyncio
+from startup import profiler, wait_until_ready, StillStarting
 
 logger = logging.getLogger('CustomCommandBot')
 
 def global_autocomplete_commands(ctx, cmd_type):
     user_id = str(ctx.interaction.user.id)
-    cmds = ctx.bot.custom_commands.get(user_id, {})
-    commands = cmds.get(cmd_type, [])
+    commands = user_commands(ctx.bot.custom_commands, user_id)[cmd_type]
     # return a simple list of command names
     return [cmd['name'] for cmd in commands]
 
 class CommandsCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, fast_start=False):
         self.bot = bot
-        self.bot.custom_commands = load_commands()
         self.active_views = []  # List to store active Views
+        self.bot.commands_ready = asyncio.Event()
+        self._warm_task = None
+        if fast_start:
+            # Start empty; commands are loaded off the event loop once connected
+            self.bot.custom_commands = {}
+        else:
+            with profiler.measure("load", "load_commands"):
+                self.bot.custom_commands = load_commands()
+            self.bot.commands_ready.set()
+
+    @commands.Cog.listener()
+    async def on_connect(self):
+        if self.bot.commands_ready.is_set() or self._warm_task is not None:
+            return
+        self._warm_task = asyncio.create_task(self.warm_commands())
+
+    async def warm_commands(self):
+        with profiler.measure("load", "load_commands (background)"):
+            self.bot.custom_commands = await asyncio.to_thread(load_commands)
+        self.bot.commands_ready.set()
+        logger.info(f"Loaded custom commands for {len(self.bot.custom_commands)} user(s) in the background.")
+
+    async def cog_before_invoke(self, ctx):
+        # In fast-start mode, hold commands until stored commands are loaded
+        await wait_until_ready(ctx, self.bot.commands_ready)
+
+    async def cog_command_error(self, ctx, error):
+        if isinstance(error, StillStarting):
+            return  # The user was already asked to try again
+        logger.error(f"Error in command {ctx.command}: {error}", exc_info=error)
 
     @commands.slash_command(name="createcmd", description="Create a custom command with cc! prefix")
     async def createcmd(self, ctx: discord.ApplicationContext):
@@ -36,9 +67,9 @@ class CommandsCog(commands.Cog):
     @commands.slash_command(name="cmdlist", description="List your custom commands")
     async def cmdlist(self, ctx: discord.ApplicationContext):
         user_id = str(ctx.author.id)
-        cmds = self.bot.custom_commands.get(user_id, {})
-        private_cmds = cmds.get("private", [])
-        public_cmds = cmds.get("public", [])
+        cmds = user_commands(self.bot.custom_commands, user_id)
+        private_cmds = cmds["private"]
+        public_cmds = cmds["public"]
         if not private_cmds and not public_cmds:
             await ctx.respond("You have no custom commands.", ephemeral=True)
             return
@@ -81,9 +112,9 @@ class CommandsCog(commands.Cog):
         )
     ):
         user_id = str(ctx.author.id)
-        cmds = self.bot.custom_commands.get(user_id, {})
-        private_cmds = cmds.get("private", [])
-        public_cmds = cmds.get("public", [])
+        cmds = user_commands(self.bot.custom_commands, user_id)
+        private_cmds = cmds["private"]
+        public_cmds = cmds["public"]
 
         # Check if the user has reached the public commands limit
         if len(public_cmds) >= 10:
@@ -91,23 +122,18 @@ class CommandsCog(commands.Cog):
             return
 
         # Check global limit for the command name
-        global_public_commands = []
-        for uid, user_cmds in self.bot.custom_commands.items():
-            for cmd in user_cmds.get("public", []):
-                if cmd['name'] == command_name.lower():
-                    global_public_commands.append((uid, cmd))
-        if len(global_public_commands) >= 5:
+        if count_global_public_commands(command_name.lower()) >= 5:
             await ctx.respond(f"The public command name `{command_name}` has reached the global limit of 5.", ephemeral=True)
             return
 
         # Find the private command to duplicate
-        command = next((cmd for cmd in private_cmds if cmd['name'] == command_name.lower()), None)
+        command = private_cmds.get(command_name.lower())
         if not command:
             await ctx.respond(f"You do not have a private command named `{command_name}`.", ephemeral=True)
             return
 
         # Check if a public command with the same name already exists for the user
-        if any(cmd['name'] == command_name.lower() for cmd in public_cmds):
+        if command_name.lower() in public_cmds:
             await ctx.respond(f"You already have a public command named `{command_name}`.", ephemeral=True)
             return
 
@@ -124,18 +150,15 @@ class CommandsCog(commands.Cog):
         if "random_choice" in command:
             duplicated_command["random_choice"] = command["random_choice"]
 
-        public_cmds.append(duplicated_command)
-        cmds["public"] = public_cmds
-        self.bot.custom_commands[user_id] = cmds
-        save_commands(self.bot.custom_commands)
+        public_cmds.add(duplicated_command)
+        save_commands(self.bot.custom_commands, user_id)
 
         logger.info(f"User {ctx.author} duplicated command `cc!{command_name}` to public commands.")
         await ctx.respond(f"Successfully duplicated `cc!{command_name}` to your public commands as `pc!{command_name}`.", ephemeral=True)
 
     async def autocomplete_commands(self, ctx: discord.AutocompleteContext, cmd_type: str):
         user_id = str(ctx.interaction.user.id)
-        cmds = self.bot.custom_commands.get(user_id, {})
-        commands = cmds.get(cmd_type, [])
+        commands = user_commands(self.bot.custom_commands, user_id)[cmd_type]
         return [
             discord.SelectOption(label=cmd['name'], description=cmd.get('description', 'No description.'))
             for cmd in commands
@@ -412,8 +435,7 @@ Enjoy customizing your Discord experience!
 
     async def sharecmd_command_name_autocomplete(self, ctx: discord.AutocompleteContext):
         user_id = str(ctx.interaction.user.id)
-        cmds = self.bot.custom_commands.get(user_id, {})
-        private_cmds = cmds.get("private", [])
+        private_cmds = user_commands(self.bot.custom_commands, user_id)["private"]
         return [
             cmd.get('name', 'No Name') for cmd in private_cmds
         ]
@@ -426,9 +448,8 @@ Enjoy customizing your Discord experience!
         target_user: Option(discord.User, "The user you want to share the command with.")
     ):
         user_id = str(ctx.author.id)
-        cmds = self.bot.custom_commands.get(user_id, {})
-        private_cmds = cmds.get("private", [])
-        command = next((cmd for cmd in private_cmds if cmd['name'] == command_name.lower()), None)
+        private_cmds = user_commands(self.bot.custom_commands, user_id)["private"]
+        command = private_cmds.get(command_name.lower())
         if not command:
             await ctx.respond(f"You do not have a command named `{command_name}`.", ephemeral=True)
             return
@@ -485,15 +506,7 @@ Enjoy customizing your Discord experience!
         user_id = str(ctx.author.id)
 
         # Find all public commands with the given name across all users
-        matching_commands = []
-        for uid, user_cmds in self.bot.custom_commands.items():
-            for cmd in user_cmds.get("public", []):
-                if cmd['name'] == command_name:
-                    matching_commands.append((uid, cmd))
-                    if len(matching_commands) >= 5:
-                        break
-            if len(matching_commands) >= 5:
-                break
+        matching_commands = find_public_commands(command_name)
 
         if not matching_commands:
             await ctx.respond(f"No public command named `{command_name}` found.", ephemeral=True)
@@ -522,15 +535,14 @@ Enjoy customizing your Discord experience!
 
     async def duplicate_public_to_private(self, interaction, target_user_id, source_user_id, command):
         # Ensure the target user has not exceeded private commands limit
-        cmds = self.bot.custom_commands.get(target_user_id, {})
-        private_cmds = cmds.get("private", [])
+        private_cmds = user_commands(self.bot.custom_commands, target_user_id)["private"]
 
         if len(private_cmds) >= 10:
             await interaction.response.send_message("You have reached the maximum of 10 private commands.", ephemeral=True)
             return
 
         # Check for duplicate in private commands
-        if any(cmd['name'] == command['name'] for cmd in private_cmds):
+        if command['name'] in private_cmds:
             await interaction.response.send_message(f"You already have a private command named `cc!{command['name']}`.", ephemeral=True)
             return
 
@@ -547,10 +559,8 @@ Enjoy customizing your Discord experience!
         if "random_choice" in command:
             duplicated_command["random_choice"] = command["random_choice"]
 
-        private_cmds.append(duplicated_command)
-        cmds["private"] = private_cmds
-        self.bot.custom_commands[target_user_id] = cmds
-        save_commands(self.bot.custom_commands)
+        user_commands(self.bot.custom_commands, target_user_id, create=True)["private"].add(duplicated_command)
+        save_commands(self.bot.custom_commands, target_user_id)
 
         source_user = self.bot.get_user(int(source_user_id))
         await interaction.response.send_message(f"Successfully saved `pc!{command['name']}` from <@{source_user_id}> to your private commands as `cc!{command['name']}`.", ephemeral=True)
@@ -3,9 +3,11 @@ import discord
 from discord.ext import commands
 from discord import Embed
 from utils import replace_placeholders
-from data import save_commands
+from templates import get_template
+from data import save_commands, find_public_commands
+from command_index import user_commands
+from placeholder_cache import guild_values, member_values
 import logging
-import re
 import asyncio
 import cogs.orange_bank as orange_bank
 from datetime import datetime
@@ -25,6 +27,8 @@ class EventsCog(commands.Cog):
         prefixes = ["cc!", "pc!"]
         for prefix in prefixes:
             if message.content.startswith(prefix):
+                # In fast-start mode, wait until stored commands are loaded
+                await self.bot.commands_ready.wait()
                 await self.handle_command(message, prefix)
                 break  # Prevent processing the same message multiple times
 
@@ -39,8 +43,7 @@ class EventsCog(commands.Cog):
         args = parts[1:]  # Extract arguments here
 
         if prefix == "cc!":
-            cmds = self.bot.custom_commands.get(user_id, {})
-            command = next((cmd for cmd in cmds.get("private", []) if cmd['name'] == command_name), None)
+            command = user_commands(self.bot.custom_commands, user_id)["private"].get(command_name)
             if not command:
                 await message.channel.send(f"Custom command `{prefix}{command_name}` not found.")
                 logger.warning(f"Command `{prefix}{command_name}` not found for user {message.author}")
@@ -48,8 +51,7 @@ class EventsCog(commands.Cog):
 
             # Extract arguments based on {[<arg_name>]} placeholders
             output = command["output"]
-            arg_pattern = re.compile(r"\{\[\<(\w+)\>\]\}")
-            arg_names = arg_pattern.findall(output)
+            arg_names = get_template(output).arg_names
             num_args = len(arg_names)
             if len(args) < num_args:
                 await message.channel.send(f"Missing arguments. This command requires {num_args} arguments: {', '.join(arg_names)}.")
@@ -93,16 +95,8 @@ class EventsCog(commands.Cog):
                 await message.channel.send("An error occurred while processing your command.")
 
         elif prefix == "pc!":
-            # Handle public commands by scanning all users
-            matching_commands = []
-            for uid, user_cmds in self.bot.custom_commands.items():
-                for cmd in user_cmds.get("public", []):
-                    if cmd['name'] == command_name:
-                        matching_commands.append((uid, cmd))
-                        if len(matching_commands) >= 5:
-                            break
-                if len(matching_commands) >= 5:
-                    break
+            # Handle public commands across all users
+            matching_commands = find_public_commands(command_name)
 
             if not matching_commands:
                 await message.channel.send(f"Public command `{prefix}{command_name}` not found.")
@@ -144,8 +138,7 @@ class EventsCog(commands.Cog):
 
         # Extract arguments based on {[<arg_name>]} placeholders
         output = command["output"]
-        arg_pattern = re.compile(r"\{\[\<(\w+)\>\]\}")
-        arg_names = arg_pattern.findall(output)
+        arg_names = get_template(output).arg_names
         num_args = len(arg_names)
         if len(supplied_args) < num_args:
             await message.channel.send(f"Missing arguments. This command requires {num_args} arguments: {', '.join(arg_names)}.")
@@ -192,3 +185,50 @@ class EventsCog(commands.Cog):
     async def on_ready(self):
         logger.info(f"Logged in as {self.bot.user} (ID: {self.bot.user.id})")
         logger.info("------")
+
+    # Keep the cached server and user placeholder values in sync with the gateway
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        # Name, icon, banner, description, owner and boost count all arrive here
+        guild_values.invalidate(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        guild_values.invalidate(guild.id)
+        member_values.invalidate_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name:
+            # [user_roles] of any member may list the renamed role
+            member_values.invalidate_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        member_values.invalidate_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        guild_values.invalidate(member.guild.id, "{member_count}")
+        member_values.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        guild_values.invalidate(member.guild.id, "{member_count}")
+        member_values.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        member_values.invalidate_member(after.guild.id, after.id)
+        if before.premium_since != after.premium_since:
+            # A member started or stopped boosting
+            guild_values.invalidate(after.guild.id, "{server_boosts}")
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        member_values.invalidate_user(after.id)
+        if before.name == after.name:
+            return
+        for guild in self.bot.guilds:
+            if guild.owner_id == after.id:
+                guild_values.invalidate(guild.id, "{server_owner}")
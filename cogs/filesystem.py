@@ -6,22 +6,122 @@ import re
 import random
 from datetime import datetime
 import calendar
+import posixpath
+import blobstore
+
+# Cost classes of shell commands
+COST_LIGHT = 'light'  # Constant or small work
+COST_HEAVY = 'heavy'  # Work grows with file sizes, tree sizes or arguments
+
+class CommandTimeout(Exception):
+    """
+    Raised by FileSystem.check_deadline() when a command runs out of CPU time.
+    """
+
+class ShellCommand:
+    """
+    A virtual shell command: its handler, called as handler(fs, args), and
+    the metadata used by help ("usage - description") and by the cogs that
+    run commands.
+    """
+    __slots__ = ('name', 'handler', 'help', 'mutates', 'cost')
+
+    def __init__(self, name, handler, help='', mutates=False, cost=COST_LIGHT):
+        self.name = name
+        self.handler = handler
+        self.help = help
+        self.mutates = mutates  # Changes the filesystem or shell state
+        self.cost = cost
+
+# Registered commands, in the order help lists them
+COMMANDS = {}
+
+def register_command(name, handler, help='', mutates=False, cost=COST_LIGHT):
+    """
+    Adds a command to every FileSystem, or replaces the one with that name.
+    Other cogs can use it to extend the shell.
+    """
+    COMMANDS[name] = ShellCommand(name, handler, help, mutates, cost)
+
+def unregister_command(name):
+    COMMANDS.pop(name, None)
+
+def shell_command(name, help='', mutates=False, cost=COST_LIGHT):
+    """
+    Decorator form of register_command for handlers taking (fs, args).
+    """
+    def decorator(handler):
+        register_command(name, handler, help, mutates, cost)
+        return handler
+    return decorator
 
 class File:
     def __init__(self, name, content=b'', permissions='rw-', owner='user'):
         self.name = name
-        self.content = content
+        self._content = content
+        self._blob = None  # Hash of the stored content, None until saved or after a change
         self.size = len(content)
         self.created_at = time.time()
         self.modified_at = self.created_at
         self.parent = None
+        self.links = []  # Directories holding an entry for this file, one per hard link
         self.permissions = permissions
         self.owner = owner
 
+    @property
+    def content(self):
+        # Content of loaded files is read from the blob store on first access
+        if self._content is None:
+            self._set_resident(blobstore.get(self._blob))
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._set_resident(value)
+        self._blob = None
+
+    def _set_resident(self, value):
+        # Keeps the loaded bytes of every directory holding this file in step
+        delta = len(value) - self.resident_size()
+        self._content = value
+        for directory in self.links:
+            directory.add_to_totals(0, loaded=delta)
+
+    def resize(self, size):
+        """
+        Sets the file size and updates the totals of every directory holding it.
+        """
+        delta = size - self.size
+        self.size = size
+        for directory in self.links:
+            directory.add_to_totals(delta)
+
+    def resident_size(self):
+        return len(self._content) if self._content is not None else 0
+
+    def blob_ref(self):
+        """
+        Returns the hash of the file's content, staging it for the blob store
+        the first time it is needed after a change.
+        """
+        if self._blob is None:
+            self._blob = blobstore.stage(self._content)
+        return self._blob
+
+    def copy(self, name):
+        """
+        Returns a new file with the same content, sharing the stored blob.
+        """
+        new_file = File(name, b'', permissions=self.permissions, owner=self.owner)
+        new_file._content = self._content
+        new_file._blob = self._blob
+        new_file.size = self.size
+        return new_file
+
     def to_dict(self):
         return {
             'name': self.name,
-            'content': self.content.decode('utf-8', errors='ignore'),
+            'blob': self.blob_ref(),
             'size': self.size,
             'created_at': self.created_at,
             'modified_at': self.modified_at,
@@ -33,10 +133,15 @@ class File:
     def from_dict(data):
         file = File(
             data['name'],
-            content=data['content'].encode('utf-8'),
             permissions=data.get('permissions', 'rw-'),
             owner=data.get('owner', 'user')
         )
+        if 'blob' in data:
+            file._content = None
+            file._blob = data['blob']
+        else:
+            # Older saves inline the content as text
+            file.content = data['content'].encode('utf-8')
         file.size = data['size']
         file.created_at = data['created_at']
         file.modified_at = data['modified_at']
@@ -51,6 +156,54 @@ class Directory:
         self.parent = None
         self.permissions = permissions
         self.owner = owner
+        # Totals of the whole subtree, kept up to date by attach(), detach() and File.resize()
+        self.subtree_size = 0  # Bytes of all file entries; a hard link counts once per entry
+        self.file_count = 0
+        self.dir_count = 0  # Directories below this one
+        self.loaded_bytes = 0  # File contents held in memory, per entry like subtree_size
+
+    def totals(self):
+        """
+        What this directory adds to its ancestors: (bytes, files, directories, loaded bytes).
+        """
+        return self.subtree_size, self.file_count, self.dir_count + 1, self.loaded_bytes
+
+    def add_to_totals(self, size, files=0, dirs=0, loaded=0):
+        directory = self
+        while directory is not None:
+            directory.subtree_size += size
+            directory.file_count += files
+            directory.dir_count += dirs
+            directory.loaded_bytes += loaded
+            directory = directory.parent
+
+    def attach(self, name, node):
+        """
+        Adds an entry and counts it in this directory and its ancestors.
+        The caller sets ``node.parent``; hard links keep their original parent.
+        """
+        self.children[name] = node
+        if isinstance(node, File):
+            node.links.append(self)
+            self.add_to_totals(node.size, 1, 0, node.resident_size())
+        else:
+            self.add_to_totals(*node.totals())
+
+    def detach(self, name):
+        """
+        Removes an entry, takes it out of the totals and returns it.
+        """
+        node = self.children.pop(name)
+        if isinstance(node, File):
+            node.links.remove(self)
+            self.add_to_totals(-node.size, -1, 0, -node.resident_size())
+        else:
+            size, files, dirs, loaded = node.totals()
+            self.add_to_totals(-size, -files, -dirs, -loaded)
+            # Later changes to files inside it (through hard links kept elsewhere)
+            # must not reach this directory any more
+            node.parent = None
+        return node
 
     def to_dict(self):
         return {
@@ -81,7 +234,7 @@ class Directory:
                 # It's a file
                 child = File.from_dict(child_data)
             child.parent = dir
-            dir.children[name] = child
+            dir.attach(name, child)
         return dir
 
 class FileSystem:
@@ -89,7 +242,6 @@ class FileSystem:
         self.root = Directory('/')
         self.root.parent = None
         self.current_dir = self.root
-        self.total_size = 0  # total size of all files
         self.max_size = 5 * 1024 * 1024  # 5MB
         self.hostname = "simfs"
         self.uptime_start = time.time()
@@ -102,6 +254,11 @@ class FileSystem:
         self.history = []  # Store the command history
         self.environment = {}  # Environment variables
         self.aliases = {}  # Command aliases
+        self.journal = []  # Mutations not yet appended to the on-disk log
+        self.journal_seq = 0  # Sequence number of the last recorded mutation
+        self.entries_since_snapshot = None  # Log length on disk; None until a snapshot exists
+        self._replaying = False
+        self._cpu_deadline = None  # thread_time() at which the running command is stopped
 
     def to_dict(self):
         return {
@@ -114,12 +271,12 @@ class FileSystem:
             'history': self.history,
             'environment': self.environment,
             'aliases': self.aliases,
+            'journal_seq': self.journal_seq,
         }
 
     def from_dict(self, data):
         self.root = Directory.from_dict(data['root'])
         self.current_dir = self.get_directory_by_path(data.get('current_path', '/'))
-        self.total_size = data.get('total_size', 0)
         self.hostname = data.get('hostname', "simfs")
         self.uptime_start = data.get('uptime_start', time.time())
         self.processes = data.get('processes', [
@@ -131,6 +288,104 @@ class FileSystem:
         self.history = data.get('history', [])
         self.environment = data.get('environment', {})
         self.aliases = data.get('aliases', {})
+        self.journal_seq = data.get('journal_seq', 0)
+
+    @property
+    def total_size(self):
+        # Total size of all files, counted while the tree changes
+        return self.root.subtree_size
+
+    def check_consistency(self):
+        """
+        Recomputes the directory totals with a full walk and returns a list of
+        the mismatches found; an empty list means the counters are exact.
+        """
+        problems = []
+
+        def walk(directory, path):
+            size = files = dirs = loaded = 0
+            for name, child in directory.children.items():
+                child_path = posixpath.join(path, name)
+                if isinstance(child, Directory):
+                    if child.parent is not directory:
+                        problems.append(f"{child_path}: parent link is wrong")
+                    child_size, child_files, child_dirs, child_loaded = walk(child, child_path)
+                    size += child_size
+                    files += child_files
+                    dirs += child_dirs + 1
+                    loaded += child_loaded
+                else:
+                    if directory not in child.links:
+                        problems.append(f"{child_path}: missing from the file's links")
+                    size += child.size
+                    files += 1
+                    loaded += child.resident_size()
+            counted = (directory.subtree_size, directory.file_count, directory.dir_count, directory.loaded_bytes)
+            if counted != (size, files, dirs, loaded):
+                problems.append(
+                    f"{path}: counted {counted[0]} bytes, {counted[1]} files, {counted[2]} directories, "
+                    f"{counted[3]} loaded bytes; found {size} bytes, {files} files, {dirs} directories, "
+                    f"{loaded} loaded bytes"
+                )
+            return size, files, dirs, loaded
+
+        walk(self.root, '/')
+        return problems
+
+    # Journal
+
+    def record(self, op, *args):
+        """
+        Records a mutation as a compact journal entry: [seq, op, *args].
+        Paths are stored absolute so entries replay independently of the cwd.
+        """
+        if self._replaying:
+            return
+        self.journal_seq += 1
+        self.journal.append([self.journal_seq, op, *args])
+
+    def abs_path(self, path):
+        path = posixpath.normpath(posixpath.join(self.get_current_path(), path))
+        return '/' + path.lstrip('/')
+
+    def replay(self, entries):
+        """
+        Re-applies journal entries on top of the loaded snapshot. Entries
+        already contained in the snapshot are skipped.
+        """
+        self._replaying = True
+        try:
+            for seq, op, *args in entries:
+                if seq <= self.journal_seq:
+                    continue
+                self.apply_journal_entry(op, args)
+                self.journal_seq = seq
+        finally:
+            self._replaying = False
+
+    def apply_journal_entry(self, op, args):
+        if op == 'history':
+            self.history.append(args[0])
+        elif op == 'write':
+            path, blob = args
+            self.write_file(path, blobstore.get(blob))
+        elif op == 'export':
+            self.environment[args[0]] = args[1]
+        elif op == 'alias':
+            self.aliases[args[0]] = args[1]
+        elif op in ('cd', 'mkdir', 'touch', 'rm', 'rmdir', 'cp', 'mv', 'ln', 'chmod', 'chown', 'kill', 'unalias'):
+            # These entries carry the command's own (absolute) arguments
+            getattr(self, f"cmd_{op}")([str(arg) for arg in args])
+
+    def memory_weight(self):
+        """
+        Approximate resident size of the tree in bytes: loaded file contents
+        plus a fixed overhead per node, read from the root's totals. Hard
+        links are counted once per entry.
+        """
+        node_overhead = 256
+        root = self.root
+        return node_overhead * (root.file_count + root.dir_count + 1) + root.loaded_bytes
 
     def get_directory_by_path(self, path):
         if path == '/':
@@ -174,8 +429,20 @@ class FileSystem:
             dir = dir.parent
         return '/' if path == '' else path
 
-    def execute_command(self, command):
+    def execute_command(self, command, cpu_limit=None):
+        prepared = self.prepare_command(command)
+        if isinstance(prepared, str):
+            return prepared
+        shell_command, args = prepared
+        return self.run_command(shell_command, args, cpu_limit)
+
+    def prepare_command(self, command):
+        """
+        Records a command line in the history and expands aliases. Returns the
+        (ShellCommand, args) to run, or the output if there is nothing to run.
+        """
         self.history.append(command)
+        self.record('history', command)
         cmd_line = command.strip()
         if not cmd_line:
             return "No command entered."
@@ -188,111 +455,44 @@ class FileSystem:
         # Check for aliases
         if cmd in self.aliases:
             alias_cmd = self.aliases[cmd]
-            # Recursively execute the alias command with the remaining args
+            # Recursively prepare the alias command with the remaining args
             new_command = alias_cmd + ' ' + ' '.join(args)
-            return self.execute_command(new_command)
-
-        if cmd == 'ls':
-            return self.cmd_ls(args)
-        elif cmd == 'cd':
-            return self.cmd_cd(args)
-        elif cmd == 'pwd':
-            return self.cmd_pwd(args)
-        elif cmd == 'mkdir':
-            return self.cmd_mkdir(args)
-        elif cmd == 'touch':
-            return self.cmd_touch(args)
-        elif cmd == 'rm':
-            return self.cmd_rm(args)
-        elif cmd == 'cat':
-            return self.cmd_cat(args)
-        elif cmd == 'echo':
-            return self.cmd_echo(args)
-        elif cmd == 'cp':
-            return self.cmd_cp(args)
-        elif cmd == 'mv':
-            return self.cmd_mv(args)
-        elif cmd == 'du':
-            return self.cmd_du(args)
-        elif cmd == 'df':
-            return self.cmd_df(args)
-        elif cmd == 'find':
-            return self.cmd_find(args)
-        elif cmd == 'grep':
-            return self.cmd_grep(args)
-        elif cmd == 'chmod':
-            return self.cmd_chmod(args)
-        elif cmd == 'chown':
-            return self.cmd_chown(args)
-        elif cmd == 'ps':
-            return self.cmd_ps(args)
-        elif cmd == 'kill':
-            return self.cmd_kill(args)
-        elif cmd == 'ping':
-            return self.cmd_ping(args)
-        elif cmd == 'uptime':
-            return self.cmd_uptime(args)
-        elif cmd == 'whoami':
-            return self.cmd_whoami(args)
-        elif cmd == 'hostname':
-            return self.cmd_hostname(args)
-        elif cmd == 'date':
-            return self.cmd_date(args)
-        elif cmd == 'cal':
-            return self.cmd_cal(args)
-        elif cmd == 'download':
-            return self.cmd_download(args)
-        elif cmd == 'help':
-            return self.cmd_help(args)
-        elif cmd == 'head':
-            return self.cmd_head(args)
-        elif cmd == 'tail':
-            return self.cmd_tail(args)
-        elif cmd == 'sort':
-            return self.cmd_sort(args)
-        elif cmd == 'uniq':
-            return self.cmd_uniq(args)
-        elif cmd == 'wc':
-            return self.cmd_wc(args)
-        elif cmd == 'sleep':
-            return self.cmd_sleep(args)
-        elif cmd == 'basename':
-            return self.cmd_basename(args)
-        elif cmd == 'dirname':
-            return self.cmd_dirname(args)
-        elif cmd == 'seq':
-            return self.cmd_seq(args)
-        elif cmd == 'factor':
-            return self.cmd_factor(args)
-        elif cmd == 'yes':
-            return self.cmd_yes(args)
-        elif cmd == 'rev':
-            return self.cmd_rev(args)
-        elif cmd == 'rmdir':
-            return self.cmd_rmdir(args)
-        elif cmd == 'ln':
-            return self.cmd_ln(args)
-        elif cmd == 'id':
-            return self.cmd_id(args)
-        elif cmd == 'history':
-            return self.cmd_history(args)
-        elif cmd == 'export':
-            return self.cmd_export(args)
-        elif cmd == 'env':
-            return self.cmd_env(args)
-        elif cmd == 'alias':
-            return self.cmd_alias(args)
-        elif cmd == 'unalias':
-            return self.cmd_unalias(args)
-        else:
+            return self.prepare_command(new_command)
+
+        shell_command = COMMANDS.get(cmd)
+        if shell_command is None:
             return f"{cmd}: command not found"
+        return shell_command, args
+
+    def run_command(self, shell_command, args, cpu_limit=None):
+        """
+        Runs a prepared command. With ``cpu_limit`` (seconds of CPU time of the
+        calling thread), handlers that call check_deadline() stop once it is used up.
+        """
+        self._cpu_deadline = time.thread_time() + cpu_limit if cpu_limit else None
+        try:
+            return shell_command.handler(self, args)
+        except CommandTimeout:
+            return f"{shell_command.name}: terminated after using its {cpu_limit:g}s CPU time limit"
+        finally:
+            self._cpu_deadline = None
+
+    def check_deadline(self):
+        """
+        Called from the loops of long running commands; raises CommandTimeout
+        once the command used up its CPU time limit.
+        """
+        if self._cpu_deadline is not None and time.thread_time() > self._cpu_deadline:
+            raise CommandTimeout()
 
     # Command methods
 
+    @shell_command('ls', help='ls - List the entries of the current directory')
     def cmd_ls(self, args):
         entries = self.current_dir.children.keys()
         return '\n'.join(entries) if entries else 'No entries found.'
 
+    @shell_command('cd', help='cd <directory> - Change the current directory', mutates=True)
     def cmd_cd(self, args):
         if not args:
             return 'cd: missing operand'
@@ -300,13 +500,16 @@ class FileSystem:
         target_dir = self.resolve_path(path)
         if target_dir and isinstance(target_dir, Directory):
             self.current_dir = target_dir
+            self.record('cd', self.get_current_path())
             return ''
         else:
             return f"cd: {path}: No such directory"
 
+    @shell_command('pwd', help='pwd - Print the current directory')
     def cmd_pwd(self, args):
         return self.get_current_path()
 
+    @shell_command('mkdir', help='mkdir <directory> - Create a directory', mutates=True)
     def cmd_mkdir(self, args):
         if not args:
             return 'mkdir: missing operand\nUsage: mkdir <directory_name>'
@@ -321,10 +524,12 @@ class FileSystem:
             return f"mkdir: cannot create directory '{dir_name}': File exists"
         new_dir = Directory(dir_name)
         new_dir.parent = parent_dir
-        parent_dir.children[dir_name] = new_dir
+        parent_dir.attach(dir_name, new_dir)
         parent_dir.modified_at = time.time()
+        self.record('mkdir', self.abs_path(path))
         return ''
 
+    @shell_command('touch', help='touch <file> - Create an empty file or update its time', mutates=True)
     def cmd_touch(self, args):
         if not args:
             return 'touch: missing file operand\nUsage: touch <file_name>'
@@ -338,14 +543,15 @@ class FileSystem:
         if filename in parent_dir.children:
             file = parent_dir.children[filename]
             file.modified_at = time.time()
-            return ''
         else:
             new_file = File(filename)
             new_file.parent = parent_dir
-            parent_dir.children[filename] = new_file
+            parent_dir.attach(filename, new_file)
             parent_dir.modified_at = time.time()
-            return ''
+        self.record('touch', self.abs_path(path))
+        return ''
 
+    @shell_command('rm', help='rm <path> - Remove a file or directory', mutates=True)
     def cmd_rm(self, args):
         if not args:
             return 'rm: missing operand\nUsage: rm <file_or_directory>'
@@ -357,14 +563,14 @@ class FileSystem:
         if not isinstance(parent_dir, Directory):
             return f"rm: '{os.path.dirname(path)}' is not a directory"
         if name in parent_dir.children:
-            item = parent_dir.children.pop(name)
-            if isinstance(item, File):
-                self.total_size -= item.size
+            parent_dir.detach(name)
             parent_dir.modified_at = time.time()
+            self.record('rm', self.abs_path(path))
             return ''
         else:
             return f"rm: cannot remove '{name}': No such file or directory"
 
+    @shell_command('rmdir', help='rmdir <directory> - Remove an empty directory', mutates=True)
     def cmd_rmdir(self, args):
         if not args:
             return 'rmdir: missing operand\nUsage: rmdir <directory>'
@@ -378,12 +584,14 @@ class FileSystem:
             return f"rmdir: failed to remove '{path}': Directory not empty"
         parent_dir = dir.parent
         if parent_dir:
-            del parent_dir.children[dir.name]
+            parent_dir.detach(dir.name)
             parent_dir.modified_at = time.time()
+            self.record('rmdir', self.abs_path(path))
             return ''
         else:
             return "rmdir: cannot remove root directory"
 
+    @shell_command('cat', help='cat <file> - Print a file')
     def cmd_cat(self, args):
         if not args:
             return 'cat: missing file operand\nUsage: cat <file_name>'
@@ -399,6 +607,7 @@ class FileSystem:
         except UnicodeDecodeError:
             return f"cat: {path}: Binary file not supported"
 
+    @shell_command('head', help='head <file> - Print the first 10 lines of a file', cost=COST_HEAVY)
     def cmd_head(self, args):
         if not args:
             return 'head: missing file operand\nUsage: head <file_name>'
@@ -411,11 +620,13 @@ class FileSystem:
         try:
             content = file.content.decode('utf-8', errors='ignore')
             lines = content.splitlines()
+            self.check_deadline()
             head_lines = lines[:10]
             return '\n'.join(head_lines) if head_lines else ''
         except UnicodeDecodeError:
             return f"head: {path}: Binary file not supported"
 
+    @shell_command('tail', help='tail <file> - Print the last 10 lines of a file', cost=COST_HEAVY)
     def cmd_tail(self, args):
         if not args:
             return 'tail: missing file operand\nUsage: tail <file_name>'
@@ -428,11 +639,13 @@ class FileSystem:
         try:
             content = file.content.decode('utf-8', errors='ignore')
             lines = content.splitlines()
+            self.check_deadline()
             tail_lines = lines[-10:]
             return '\n'.join(tail_lines) if tail_lines else ''
         except UnicodeDecodeError:
             return f"tail: {path}: Binary file not supported"
 
+    @shell_command('sort', help='sort <file> - Print the lines of a file sorted', cost=COST_HEAVY)
     def cmd_sort(self, args):
         if not args:
             return 'sort: missing file operand\nUsage: sort <file_name>'
@@ -445,11 +658,14 @@ class FileSystem:
         try:
             content = file.content.decode('utf-8', errors='ignore')
             lines = content.splitlines()
+            self.check_deadline()
             lines.sort()
+            self.check_deadline()
             return '\n'.join(lines) if lines else ''
         except UnicodeDecodeError:
             return f"sort: {path}: Binary file not supported"
 
+    @shell_command('uniq', help='uniq <file> - Print a file without repeated adjacent lines', cost=COST_HEAVY)
     def cmd_uniq(self, args):
         if not args:
             return 'uniq: missing file operand\nUsage: uniq <file_name>'
@@ -464,7 +680,9 @@ class FileSystem:
             lines = content.splitlines()
             unique_lines = []
             previous_line = None
-            for line in lines:
+            for number, line in enumerate(lines):
+                if not number % 4096:
+                    self.check_deadline()
                 if line != previous_line:
                     unique_lines.append(line)
                     previous_line = line
@@ -472,6 +690,7 @@ class FileSystem:
         except UnicodeDecodeError:
             return f"uniq: {path}: Binary file not supported"
 
+    @shell_command('wc', help='wc <file> - Count the lines, words and characters of a file', cost=COST_HEAVY)
     def cmd_wc(self, args):
         if not args:
             return 'wc: missing file operand\nUsage: wc <file_name>'
@@ -484,12 +703,15 @@ class FileSystem:
         try:
             content = file.content.decode('utf-8', errors='ignore')
             lines = content.splitlines()
+            self.check_deadline()
             words = content.split()
+            self.check_deadline()
             chars = len(content)
             return f"{len(lines)} {len(words)} {chars} {path}"
         except UnicodeDecodeError:
             return f"wc: {path}: Binary file not supported"
 
+    @shell_command('download', help='download <file> - Send a file as an attachment')
     def cmd_download(self, args):
         if not args:
             return 'download: missing file operand\nUsage: download <file_name>'
@@ -501,12 +723,14 @@ class FileSystem:
             return f"download: {path}: Is a directory"
         return (path, file.content)
 
+    @shell_command('echo', help='echo <text> - Print text')
     def cmd_echo(self, args):
         if not args:
             return ''
         output = ' '.join(args)
         return output
 
+    @shell_command('cp', help='cp <source> <destination> - Copy a file', mutates=True)
     def cmd_cp(self, args):
         if len(args) < 2:
             return "cp: missing file operands\nUsage: cp <source> <destination>"
@@ -525,12 +749,16 @@ class FileSystem:
             return f"cp: '{os.path.dirname(destination)}' is not a directory"
         if dest_name in parent_dir.children:
             return f"cp: cannot overwrite existing file '{destination}'"
-        new_file = File(dest_name, src_file.content, permissions=src_file.permissions, owner=src_file.owner)
+        if not self._replaying and self.total_size + src_file.size > self.max_size:
+            return f"cp: cannot create regular file '{destination}': Storage limit exceeded"
+        new_file = src_file.copy(dest_name)
         new_file.parent = parent_dir
-        parent_dir.children[dest_name] = new_file
+        parent_dir.attach(dest_name, new_file)
         parent_dir.modified_at = time.time()
+        self.record('cp', self.abs_path(source), self.abs_path(destination))
         return ''
 
+    @shell_command('mv', help='mv <source> <destination> - Move or rename a file or directory', mutates=True)
     def cmd_mv(self, args):
         if len(args) < 2:
             return "mv: missing file operands\nUsage: mv <source> <destination>"
@@ -550,26 +778,25 @@ class FileSystem:
             return f"mv: '{os.path.dirname(destination)}' is not a directory"
         if dest_name in parent_dest.children:
             return f"mv: cannot overwrite existing item '{destination}'"
+        # A directory cannot be moved into itself or below itself
+        ancestor = parent_dest
+        while ancestor is not None:
+            if ancestor is src_item:
+                return f"mv: cannot move '{source}' to a subdirectory of itself, '{destination}'"
+            ancestor = ancestor.parent
+        self.record('mv', self.abs_path(source), self.abs_path(destination))
         # Remove from source
-        del parent_src.children[src_item.name]
+        parent_src.detach(src_item.name)
         parent_src.modified_at = time.time()
         # Add to destination
         src_item.name = dest_name
         src_item.parent = parent_dest
-        parent_dest.children[dest_name] = src_item
+        parent_dest.attach(dest_name, src_item)
         parent_dest.modified_at = time.time()
         return ''
 
+    @shell_command('du', help='du [directory] - Show the disk usage of a directory')
     def cmd_du(self, args):
-        def get_size(directory):
-            size = 0
-            for child in directory.children.values():
-                if isinstance(child, File):
-                    size += child.size
-                elif isinstance(child, Directory):
-                    size += get_size(child)
-            return size
-
         if not args:
             target_dir = self.current_dir
         else:
@@ -578,9 +805,10 @@ class FileSystem:
             if not target_dir or not isinstance(target_dir, Directory):
                 return f"du: cannot access '{path}': No such directory"
 
-        size = get_size(target_dir)
+        size = target_dir.subtree_size
         return f"{size // 1024}KB\t{self.get_current_path()}"
 
+    @shell_command('df', help='df - Show the used and free storage')
     def cmd_df(self, args):
         used = self.total_size
         free = self.max_size - used
@@ -589,6 +817,14 @@ class FileSystem:
             f"/dev/simfs      5MB    {used // 1024}KB    {free // 1024}KB"
         )
 
+    @shell_command('fsck', help='fsck - Check the storage counters against the files', cost=COST_HEAVY)
+    def cmd_fsck(self, args):
+        problems = self.check_consistency()
+        if problems:
+            return 'fsck: found problems:\n' + '\n'.join(problems)
+        return f"fsck: clean, {self.root.file_count} files, {self.root.dir_count} directories, {self.total_size} bytes"
+
+    @shell_command('find', help='find <path> <name> - Find entries by name', cost=COST_HEAVY)
     def cmd_find(self, args):
         if len(args) < 2:
             return "find: missing search path and name\nUsage: find <path> <name>"
@@ -601,6 +837,7 @@ class FileSystem:
         found = []
 
         def search(directory, current_path):
+            self.check_deadline()
             for child in directory.children.values():
                 child_path = os.path.join(current_path, child.name)
                 if child.name == name:
@@ -614,6 +851,7 @@ class FileSystem:
         else:
             return f"find: '{name}' not found in '{path}'"
 
+    @shell_command('grep', help='grep <pattern> <file> - Print the lines of a file containing a pattern', cost=COST_HEAVY)
     def cmd_grep(self, args):
         if len(args) < 2:
             return "grep: missing pattern or file\nUsage: grep <pattern> <file>"
@@ -628,13 +866,18 @@ class FileSystem:
             content = file.content.decode('utf-8', errors='ignore')
         except UnicodeDecodeError:
             return f"grep: {filepath}: Binary file not supported"
-        lines = content.splitlines()
-        matched = [line for line in lines if pattern in line]
+        matched = []
+        for number, line in enumerate(content.splitlines()):
+            if not number % 4096:
+                self.check_deadline()
+            if pattern in line:
+                matched.append(line)
         if matched:
             return '\n'.join(matched)
         else:
             return f"grep: pattern not found in {filepath}"
 
+    @shell_command('chmod', help='chmod <permissions> <path> - Change permissions', mutates=True)
     def cmd_chmod(self, args):
         if len(args) < 2:
             return "chmod: missing operand\nUsage: chmod <permissions> <file>"
@@ -647,8 +890,10 @@ class FileSystem:
             return f"chmod: cannot access '{filepath}': No such file or directory"
         file.permissions = permissions
         file.modified_at = time.time()
+        self.record('chmod', permissions, self.abs_path(filepath))
         return ''
 
+    @shell_command('chown', help='chown <owner> <path> - Change the owner', mutates=True)
     def cmd_chown(self, args):
         if len(args) < 2:
             return "chown: missing operand\nUsage: chown <owner> <file>"
@@ -659,8 +904,10 @@ class FileSystem:
             return f"chown: cannot access '{filepath}': No such file or directory"
         file.owner = owner
         file.modified_at = time.time()
+        self.record('chown', owner, self.abs_path(filepath))
         return ''
 
+    @shell_command('ps', help='ps - List running processes')
     def cmd_ps(self, args):
         header = "PID\tNAME"
         lines = [header]
@@ -668,6 +915,7 @@ class FileSystem:
             lines.append(f"{proc['pid']}\t{proc['name']}")
         return '\n'.join(lines) if self.processes else "No running processes."
 
+    @shell_command('kill', help='kill <pid> - Stop a process', mutates=True)
     def cmd_kill(self, args):
         if not args:
             return "kill: missing PID\nUsage: kill <pid>"
@@ -678,9 +926,11 @@ class FileSystem:
         for proc in self.processes:
             if proc['pid'] == pid:
                 self.processes.remove(proc)
+                self.record('kill', pid)
                 return ''
         return f"kill: cannot kill PID {pid}: No such process"
 
+    @shell_command('ping', help='ping <host> - Ping a host')
     def cmd_ping(self, args):
         if not args:
             return "ping: missing host\nUsage: ping <host>"
@@ -696,6 +946,7 @@ class FileSystem:
         )
         return response
 
+    @shell_command('uptime', help='uptime - Show how long the system has been running')
     def cmd_uptime(self, args):
         uptime_seconds = int(time.time() - self.uptime_start)
         days, remainder = divmod(uptime_seconds, 86400)
@@ -703,36 +954,38 @@ class FileSystem:
         minutes, seconds = divmod(remainder, 60)
         return f"Uptime: {days} days, {hours} hours, {minutes} minutes, {seconds} seconds"
 
+    @shell_command('whoami', help='whoami - Print the current user')
     def cmd_whoami(self, args):
         return "user"
 
+    @shell_command('who', help='who - Print the logged in users')
     def cmd_who(self, args):
         return "user"
 
+    @shell_command('id', help='id - Print the user and group ids')
     def cmd_id(self, args):
         return 'uid=1000(user) gid=1000(user) groups=1000(user)'
 
+    @shell_command('hostname', help='hostname - Print the host name')
     def cmd_hostname(self, args):
         return self.hostname
 
+    @shell_command('date', help='date - Print the date and time')
     def cmd_date(self, args):
         return datetime.now().strftime("%a %b %d %H:%M:%S %Z %Y")
 
+    @shell_command('cal', help="cal - Print this month's calendar")
     def cmd_cal(self, args):
         now = datetime.now()
         cal = calendar.month(now.year, now.month)
         return cal
 
+    @shell_command('help', help='help - List the available commands')
     def cmd_help(self, args):
-        commands = [
-            'ls', 'cd', 'pwd', 'mkdir', 'touch', 'rm', 'rmdir', 'cat', 'echo', 'cp', 'mv',
-            'du', 'df', 'find', 'grep', 'chmod', 'chown', 'ps', 'kill', 'ping',
-            'uptime', 'whoami', 'who', 'id', 'hostname', 'date', 'cal', 'help', 'download',
-            'head', 'tail', 'sort', 'uniq', 'wc', 'sleep', 'basename', 'dirname',
-            'seq', 'factor', 'yes', 'rev', 'ln', 'history', 'export', 'env', 'alias', 'unalias'
-        ]
-        return 'Available commands:\n' + '\n'.join(commands)
+        lines = [command.help or name for name, command in COMMANDS.items()]
+        return 'Available commands:\n' + '\n'.join(lines)
 
+    @shell_command('sleep', help='sleep <seconds> - Wait (simulated)')
     def cmd_sleep(self, args):
         if not args:
             return 'sleep: missing operand\nUsage: sleep <seconds>'
@@ -744,18 +997,21 @@ class FileSystem:
         except ValueError:
             return 'sleep: invalid time interval'
 
+    @shell_command('basename', help='basename <path> - Print the last component of a path')
     def cmd_basename(self, args):
         if not args:
             return 'basename: missing operand\nUsage: basename <path>'
         path = args[0]
         return os.path.basename(path)
 
+    @shell_command('dirname', help='dirname <path> - Print the directory part of a path')
     def cmd_dirname(self, args):
         if not args:
             return 'dirname: missing operand\nUsage: dirname <path>'
         path = args[0]
         return os.path.dirname(path)
 
+    @shell_command('seq', help='seq <number> - Print the numbers from 1 to number', cost=COST_HEAVY)
     def cmd_seq(self, args):
         if not args:
             return 'seq: missing operand\nUsage: seq <number>'
@@ -763,10 +1019,16 @@ class FileSystem:
             num = int(args[0])
             if num < 1:
                 return 'seq: number must be greater than 0'
-            return '\n'.join(str(i) for i in range(1, num+1))
+            numbers = []
+            for i in range(1, num+1):
+                if not i % 65536:
+                    self.check_deadline()
+                numbers.append(str(i))
+            return '\n'.join(numbers)
         except ValueError:
             return 'seq: invalid number'
 
+    @shell_command('factor', help='factor <number> - Print the prime factors of a number', cost=COST_HEAVY)
     def cmd_factor(self, args):
         if not args:
             return 'factor: missing operand\nUsage: factor <number>'
@@ -778,6 +1040,8 @@ class FileSystem:
             i = 2
             original_num = num
             while i * i <= num:
+                if not i % 65536:
+                    self.check_deadline()
                 if num % i:
                     i += 1
                 else:
@@ -789,10 +1053,12 @@ class FileSystem:
         except ValueError:
             return 'factor: invalid number'
 
+    @shell_command('yes', help='yes - Print y repeatedly')
     def cmd_yes(self, args):
         output = 'y\n' * 10
         return output.strip()
 
+    @shell_command('rev', help='rev <file> - Print each line of a file reversed', cost=COST_HEAVY)
     def cmd_rev(self, args):
         if not args:
             return 'rev: missing file operand\nUsage: rev <file_name>'
@@ -804,11 +1070,17 @@ class FileSystem:
             return f"rev: {path}: Is a directory"
         try:
             content = file.content.decode('utf-8', errors='ignore')
-            reversed_content = '\n'.join(line[::-1] for line in content.splitlines())
+            reversed_lines = []
+            for number, line in enumerate(content.splitlines()):
+                if not number % 4096:
+                    self.check_deadline()
+                reversed_lines.append(line[::-1])
+            reversed_content = '\n'.join(reversed_lines)
             return reversed_content if reversed_content else ''
         except UnicodeDecodeError:
             return f"rev: {path}: Binary file not supported"
 
+    @shell_command('ln', help='ln <source> <link> - Create a hard link', mutates=True)
     def cmd_ln(self, args):
         if len(args) < 2:
             return "ln: missing file operands\nUsage: ln <source> <link_name>"
@@ -827,16 +1099,21 @@ class FileSystem:
             return f"ln: '{os.path.dirname(link_name)}' is not a directory"
         if link_basename in parent_dir.children:
             return f"ln: failed to create hard link '{link_name}': File exists"
-        parent_dir.children[link_basename] = src_file
+        if not self._replaying and self.total_size + src_file.size > self.max_size:
+            return f"ln: failed to create hard link '{link_name}': Storage limit exceeded"
+        parent_dir.attach(link_basename, src_file)
         parent_dir.modified_at = time.time()
+        self.record('ln', self.abs_path(source), self.abs_path(link_name))
         return ''
 
+    @shell_command('history', help='history - Show the last 10 commands')
     def cmd_history(self, args):
         output = ''
         for i, cmd in enumerate(self.history[-10:], start=1):
             output += f"{i} {cmd}\n"
         return output.strip() if output else "No history available."
 
+    @shell_command('export', help='export VAR=value - Set an environment variable', mutates=True)
     def cmd_export(self, args):
         if not args:
             return 'export: missing operand\nUsage: export VAR=value'
@@ -845,14 +1122,17 @@ class FileSystem:
             return 'export: invalid format. Use VAR=value'
         var, value = assignment.split('=', 1)
         self.environment[var] = value
+        self.record('export', var, value)
         return ''
 
+    @shell_command('env', help='env - Print the environment variables')
     def cmd_env(self, args):
         if self.environment:
             return '\n'.join(f"{key}={value}" for key, value in self.environment.items())
         else:
             return ''
 
+    @shell_command('alias', help="alias [name='command'] - Define or list aliases", mutates=True)
     def cmd_alias(self, args):
         if not args:
             if self.aliases:
@@ -866,14 +1146,17 @@ class FileSystem:
             name, command = assignment.split('=', 1)
             command = command.strip("'\"")
             self.aliases[name.strip()] = command.strip()
+            self.record('alias', name.strip(), command.strip())
             return ''
 
+    @shell_command('unalias', help='unalias <name> - Remove an alias', mutates=True)
     def cmd_unalias(self, args):
         if not args:
             return 'unalias: missing operand\nUsage: unalias name'
         name = args[0]
         if name in self.aliases:
             del self.aliases[name]
+            self.record('unalias', name)
             return ''
         else:
             return f'unalias: {name}: not found'
@@ -886,7 +1169,48 @@ class FileSystem:
             return False  # Exceeds storage limit
         new_file = File(filename, content)
         new_file.parent = self.current_dir
-        self.current_dir.children[filename] = new_file
+        self.current_dir.attach(filename, new_file)
         self.current_dir.modified_at = time.time()
-        self.total_size += size
+        self.record('write', self.abs_path(filename), new_file.blob_ref())
         return True
+
+    def write_file(self, path, content, replaces=None):
+        """
+        Creates the file at ``path`` or replaces its content; with ``replaces``
+        the entry at that path is removed as well (a rename). The size change
+        is charged once for every hard link of the file and the write is
+        refused if it would exceed the storage limit. Returns an error
+        message, or '' on success.
+        """
+        if replaces and self.abs_path(replaces) == self.abs_path(path):
+            replaces = None
+        file = self.resolve_path(path)
+        if isinstance(file, Directory):
+            return f"Cannot save file. A directory with the name '{path}' exists."
+        if not file:
+            parent_path = os.path.dirname(path)
+            parent_dir = self.resolve_path(parent_path)
+            if not parent_dir or not isinstance(parent_dir, Directory):
+                return f"Cannot save file. Directory '{parent_path}' does not exist."
+        if not self._replaying:
+            size = len(content)
+            change = (size - file.size) * len(file.links) if file else size
+            old_file = self.resolve_path(replaces) if replaces else None
+            if isinstance(old_file, File):
+                # Removing that entry frees its bytes, after this write if it is the same file
+                change -= size if old_file is file else old_file.size
+            if self.total_size + change > self.max_size:
+                return "Cannot save file. Storage limit exceeded."
+        if file:
+            file.content = content
+            file.resize(len(content))
+            file.modified_at = time.time()
+        else:
+            file = File(os.path.basename(path), content)
+            file.parent = parent_dir
+            parent_dir.attach(file.name, file)
+            parent_dir.modified_at = time.time()
+        self.record('write', self.abs_path(path), file.blob_ref())
+        if replaces and isinstance(self.resolve_path(replaces), File):
+            self.cmd_rm([replaces])
+        return ''
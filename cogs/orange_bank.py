@@ -4,76 +4,286 @@ import discord
 from discord.ext import commands
 import asyncio
 import logging
+import time
 import config
 
 logger = logging.getLogger('CustomCommandBot')
 
+class OrangeBankError(Exception):
+    """
+    A request to Orange Bank failed; the message is shown in place of the value.
+    """
+
+class OrangeBankCache:
+    """
+    Orange Bank values per (user_id, request_type). A value is fresh for the
+    TTL of its field and stale for ``stale_for`` seconds after that; stale
+    values are served while OrangeBankCog refreshes them in the background.
+    """
+    FRESH = "fresh"
+    STALE = "stale"
+
+    def __init__(self, ttls, default_ttl, stale_for, stats_every=0):
+        self.ttls = ttls  # request_type -> seconds
+        self.default_ttl = default_ttl
+        self.stale_for = stale_for
+        self.stats_every = stats_every  # Log stats every this many lookups; 0 disables
+        self._values = {}  # (user_id, request_type) -> (value, fetched_at)
+        self._stores = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def lookup(self, user_id, request_type):
+        """
+        Returns (value, FRESH or STALE), or (None, None) if nothing usable is cached.
+        """
+        entry = self._values.get((user_id, request_type))
+        state = None
+        if entry is not None:
+            age = time.monotonic() - entry[1]
+            ttl = self.ttls.get(request_type, self.default_ttl)
+            if age < ttl:
+                state = self.FRESH
+                self.hits += 1
+            elif age < ttl + self.stale_for:
+                state = self.STALE
+                self.stale_hits += 1
+        if state is None:
+            self.misses += 1
+        if self.stats_every and (self.hits + self.stale_hits + self.misses) % self.stats_every == 0:
+            logger.info(f"Orange Bank cache stats: {self.stats()}")
+        return (entry[0], state) if state else (None, None)
+
+    def store(self, user_id, request_type, value):
+        now = time.monotonic()
+        self._values[(user_id, request_type)] = (value, now)
+        self._stores += 1
+        if self._stores % 1000 == 0:
+            self._prune(now)
+
+    def _prune(self, now):
+        # Drop values too old to be served even as stale
+        expired = [
+            key for key, (_, fetched_at) in self._values.items()
+            if now - fetched_at >= self.ttls.get(key[1], self.default_ttl) + self.stale_for
+        ]
+        for key in expired:
+            del self._values[key]
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._values),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+class CircuitBreaker:
+    """
+    Stops requests to Orange Bank after ``failure_threshold`` failures in a
+    row (open). After ``reset_timeout`` seconds one probe request is let
+    through (half-open); its success closes the breaker again, its failure
+    reopens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0  # Consecutive failures
+        self.opened_at = 0.0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+            return True  # This request is the probe
+        if self.state == self.CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state):
+        logger.warning(f"Orange Bank circuit breaker {self.state} -> {state} ({self.failures} consecutive failures)")
+        self.state = state
+
+class PendingRequest:
+    """
+    A request posted to the logs channel whose reply has not arrived yet.
+    """
+    __slots__ = ("user_ids", "request_type", "channel_id", "message_id", "future")
+
+    def __init__(self, user_ids, request_type, channel_id):
+        self.user_ids = user_ids  # Tuple of the uids the request is about
+        self.request_type = request_type
+        self.channel_id = channel_id
+        self.message_id = None  # Set once the request message is sent
+        self.future = asyncio.get_running_loop().create_future()
+
+class RequestBatch:
+    """
+    Fields of several users collected during the batching window, sent to
+    Orange Bank as one "#feedback batch" message.
+    """
+    __slots__ = ("fields_by_user", "future")
+
+    def __init__(self):
+        self.fields_by_user = {}  # user_id -> set of request types
+        self.future = asyncio.get_running_loop().create_future()  # {uid: {key: value}}
+
+    def message(self) -> str:
+        lines = ["talktome", "#feedback batch"]
+        for user_id, request_types in self.fields_by_user.items():
+            lines.append(" ".join([str(user_id)] + sorted(request_types)))
+        return "\n".join(lines)
+
 class OrangeBankCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.orange_bank_id = 1090982396574306304  # Orange Bank UID
+        self.orange_bank_id = config.ORANGE_BANK_USER_ID
+        self._channel = None  # The logs channel, resolved by resolve_routing()
+        self._pending = []  # PendingRequest objects, oldest first
+        self.cache = OrangeBankCache(
+            config.ORANGE_BANK_TTL, config.ORANGE_BANK_DEFAULT_TTL,
+            config.ORANGE_BANK_STALE_FOR, config.ORANGE_BANK_CACHE_STATS_EVERY,
+        )
+        self._refreshing = set()  # (user_id, request_type) being refreshed in the background
+        self._tasks = set()  # Background refresh tasks, referenced until done
+        self._inflight = {}  # (user_id, request_type) -> future of the request in flight
+        self.coalesced = 0  # Fields served by joining a request already in flight
+        self._open_batch = None  # RequestBatch still collecting fields
+        self.breaker = CircuitBreaker(config.ORANGE_BANK_BREAKER_FAILURES, config.ORANGE_BANK_BREAKER_RESET)
 
     async def send_orange_bank_request(self, user_id: int, request_type: str) -> str:
         """
-        Sends a request to Orange Bank and retrieves the response by reading channel history.
+        Sends a request to Orange Bank and waits for its reply, which on_message
+        matches to this request as soon as it is posted.
         """
+        try:
+            return await self._fetch_one(user_id, request_type)
+        except OrangeBankError as e:
+            return str(e)
+
+    async def _fetch_one(self, user_id: int, request_type: str) -> str:
         if request_type not in config.PLACEHOLDERS["ob_"]["placeholders"]:
             logger.error(f"Invalid request type: {request_type}")
-            return "Invalid request type."
+            raise OrangeBankError("Invalid request type.")
+        content = await self._round_trip(user_id, request_type)
+        if not content.strip().startswith("Sure."):
+            logger.error("Unexpected response format from Orange Bank.")
+            raise OrangeBankError("Unexpected response format.")
 
+        # Parse the response message
+        response = self.parse_orange_bank_response(content)
+        logger.info(f"Received response from Orange Bank for user_id {user_id}: {response}")
+        return response
+
+    async def _round_trip(self, user_id: int, request_type: str) -> str:
+        """
+        Posts one request to the logs channel and returns the content of the reply.
+        Raises OrangeBankError with the text to show in place of the value.
+        """
         # Format the message as per Orange Bank's expected format
         message_content = f"""talktome
 #feedback {request_type}
 {user_id}"""
+        return await self._exchange(message_content, (user_id,), request_type)
 
+    async def _exchange(self, message_content: str, user_ids, request_type: str) -> str:
+        """
+        Posts a request message and waits for the reply matched to it by on_message.
+        """
         try:
-            # Get the Orange Bank user
-            orange_bank_user = await self.bot.fetch_user(self.orange_bank_id)
-            if not orange_bank_user:
-                logger.error(f"Orange Bank user with ID {self.orange_bank_id} not found.")
-                return "Orange Bank user not found."
-
-            # Find the guild and the 'logs' channel
-            guild = self.bot.get_guild(1079761115636043926)
-            if not guild:
-                logger.error("Guild with ID 1079761115636043926 not found.")
-                return "Internal error: Guild not found."
-
-            channel = discord.utils.get(guild.text_channels, name="logs")
+            channel = self._channel or self.resolve_routing()
             if not channel:
-                logger.error("Logs channel not found in the guild.")
-                return "Internal error: Logs channel not found."
-
-            # Send the request message to the logs channel
-            sent_message = await channel.send(message_content)
-            logger.info(f"Sent request to Orange Bank for user_id {user_id}: {request_type}")
-
-            # Wait for 2 seconds
-            await asyncio.sleep(2)
-
-            # Fetch messages after the sent message
-            messages = await channel.history(after=sent_message, limit=10).flatten()
+                raise OrangeBankError("Internal error: Logs channel not found.")
 
-            # Find the first message from Orange Bank after the sent message
-            response_message = None
-            for msg in messages:
-                if msg.author.id == self.orange_bank_id:
-                    response_message = msg
-                    break
+            if not self.breaker.allow():
+                raise OrangeBankError("Orange Bank is unavailable.")
 
-            if not response_message:
-                logger.error(f"No response from Orange Bank for user_id {user_id}: {request_type}")
-                return "No response from Orange Bank."
+            # Register before sending so a fast reply cannot be missed
+            pending = PendingRequest(tuple(user_ids), request_type, channel.id)
+            self._pending.append(pending)
+            answered = False
+            # The timeout covers sending the request and waiting for the reply
+            deadline = asyncio.get_running_loop().time() + config.ORANGE_BANK_TIMEOUT
+            try:
+                # Send the request message to the logs channel
+                sent_message = await asyncio.wait_for(channel.send(message_content), timeout=config.ORANGE_BANK_TIMEOUT)
+                pending.message_id = sent_message.id
+                logger.info(f"Sent request to Orange Bank for user_id {', '.join(map(str, user_ids))}: {request_type}")
 
-            # Parse the response message
-            response = self.parse_orange_bank_response(response_message.content)
-            logger.info(f"Received response from Orange Bank for user_id {user_id}: {response}")
-
-            return response
+                # Wait for on_message to hand over the matching reply
+                remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+                content = await asyncio.wait_for(pending.future, timeout=remaining)
+                answered = True
+                return content
+            except asyncio.TimeoutError:
+                logger.error(f"No response from Orange Bank for user_id {', '.join(map(str, user_ids))}: {request_type}")
+                raise OrangeBankError("No response from Orange Bank.")
+            finally:
+                if pending in self._pending:
+                    self._pending.remove(pending)
+                if answered:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
 
+        except OrangeBankError:
+            raise
         except Exception as e:
             logger.error(f"Error sending request to Orange Bank: {e}")
-            return "An error occurred while communicating with Orange Bank."
+            raise OrangeBankError("An error occurred while communicating with Orange Bank.")
+
+    @staticmethod
+    def parse_response_fields(content: str) -> dict:
+        """
+        Returns the "key: value" lines of an Orange Bank reply, keys lowercased.
+        """
+        data = {}
+        for line in content.split("\n"):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                data[key.strip().lower()] = value.strip()
+        return data
+
+    @staticmethod
+    def parse_response_sections(content: str) -> dict:
+        """
+        Splits a reply into {uid: {key: value}}. Every "UID:" line starts the
+        section of that user; a single-field reply has exactly one section.
+        """
+        sections = {}
+        fields = None
+        for line in content.split("\n"):
+            if ':' not in line:
+                continue
+            key, value = line.split(':', 1)
+            key = key.strip().lower()
+            if key == 'uid':
+                fields = sections.setdefault(value.strip(), {})
+            elif fields is not None:
+                fields[key] = value.strip()
+        return sections
 
     def parse_orange_bank_response(self, content: str) -> str:
         """
@@ -84,12 +294,7 @@ class OrangeBankCog(commands.Cog):
             logger.error("Unexpected response format from Orange Bank.")
             return "Unexpected response format."
 
-        lines = content.split("\n")
-        data = {}
-        for line in lines:
-            if ':' in line:
-                key, value = line.split(':', 1)
-                data[key.strip().lower()] = value.strip()
+        data = self.parse_response_fields(content)
 
         # Depending on the request type, extract the relevant data
         # Assuming that the response contains only the requested data
@@ -109,14 +314,329 @@ class OrangeBankCog(commands.Cog):
         """
         Interface function to be called by other parts of the bot to request data from Orange Bank.
         """
-        response = await self.send_orange_bank_request(user_id, request_type)
+        response = (await self.request_orange_bank_fields(user_id, [request_type]))[request_type]
         return response
 
-    # Remove the on_message listener since it's no longer needed
-    # @commands.Cog.listener()
-    # async def on_message(self, message):
-    #     # Existing listener code is removed
-    #     pass
+    async def request_orange_bank_fields(self, user_id: int, request_types) -> dict:
+        """
+        Requests several ob_ fields of one user and returns {request_type: value}.
+        Cached values are served while fresh; expired ones are still served for a
+        while (config.ORANGE_BANK_STALE_FOR) and refreshed in the background.
+        Fields not fetched within config.ORANGE_BANK_RENDER_BUDGET get a fallback.
+        """
+        request_types = list(dict.fromkeys(request_types))
+        results = {}
+        missing = []
+        stale = []
+        for request_type in request_types:
+            value, state = self.cache.lookup(user_id, request_type)
+            if state is None:
+                missing.append(request_type)
+                continue
+            results[request_type] = value
+            if state == OrangeBankCache.STALE:
+                stale.append(request_type)
+        if stale:
+            self._refresh_in_background(user_id, stale)
+        if missing:
+            # The fetch keeps running past the render budget so its values
+            # still reach the cache for the next render
+            task = asyncio.get_running_loop().create_task(self._fetch_fields(user_id, missing))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            done, _ = await asyncio.wait({task}, timeout=config.ORANGE_BANK_RENDER_BUDGET)
+            if task in done:
+                fetched = task.result()
+            else:
+                logger.warning(f"Orange Bank fields {', '.join(missing)} for user_id {user_id} exceeded the render budget")
+                fetched = {}
+            for request_type in missing:
+                value = fetched.get(request_type, OrangeBankError("No response from Orange Bank."))
+                results[request_type] = str(value) if isinstance(value, OrangeBankError) else value
+        return results
+
+    def _refresh_in_background(self, user_id: int, request_types):
+        request_types = [
+            request_type for request_type in request_types
+            if (user_id, request_type) not in self._refreshing
+        ]
+        if not request_types:
+            return
+        self._refreshing.update((user_id, request_type) for request_type in request_types)
+        self.cache.refreshes += 1
+        task = asyncio.get_running_loop().create_task(self._refresh(user_id, request_types))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, user_id: int, request_types):
+        try:
+            await self._fetch_fields(user_id, request_types)
+        finally:
+            self._refreshing.difference_update((user_id, request_type) for request_type in request_types)
+
+    async def _fetch_fields(self, user_id: int, request_types) -> dict:
+        """
+        Fetches fields from Orange Bank and returns {request_type: value or
+        OrangeBankError}. A field that is already being fetched for the user is
+        not requested again; the caller waits for the request in flight.
+        """
+        results = {}
+        waiting = {}
+        owned = {}
+        loop = asyncio.get_running_loop()
+        for request_type in request_types:
+            future = self._inflight.get((user_id, request_type))
+            if future is not None:
+                waiting[request_type] = future
+            else:
+                owned[request_type] = self._inflight[(user_id, request_type)] = loop.create_future()
+        if waiting:
+            self.coalesced += len(waiting)
+        if owned:
+            fetched = {}
+            try:
+                fetched = await self._fetch_uncoalesced(user_id, list(owned))
+            finally:
+                # Hand the outcome to every caller waiting on these fields
+                for request_type, future in owned.items():
+                    del self._inflight[(user_id, request_type)]
+                    future.set_result(fetched.get(
+                        request_type, OrangeBankError("An error occurred while communicating with Orange Bank.")
+                    ))
+            results.update(fetched)
+        for request_type, future in waiting.items():
+            # Shielded so a cancelled waiter does not cancel the shared request
+            results[request_type] = await asyncio.shield(future)
+        return results
+
+    async def _fetch_uncoalesced(self, user_id: int, request_types) -> dict:
+        """
+        Fetches fields from Orange Bank and caches the values that arrived.
+        Returns {request_type: value or OrangeBankError}. Fields that can be read
+        from an ob_all reply share one ob_all round trip, which also answers
+        ob_all itself; it runs concurrently with the requests for the rest.
+        """
+        results = {}
+        projectable = [request_type for request_type in request_types if request_type in config.ORANGE_BANK_ALL_KEYS]
+        shared = None  # One request answering several fields
+        shared_fields = []
+        if projectable and config.ORANGE_BANK_BATCH_REQUESTS:
+            shared = self._fetch_batched(user_id, projectable)
+            shared_fields = projectable
+        elif len(projectable) > 1 or (projectable and "ob_all" in request_types):
+            shared = self._fetch_projected(user_id)
+            shared_fields = projectable + [request_type for request_type in request_types if request_type == "ob_all"]
+        remaining = [request_type for request_type in request_types if request_type not in shared_fields]
+        requests = [self._fetch_one(user_id, request_type) for request_type in remaining]
+        if shared is not None:
+            requests.append(shared)
+        responses = await asyncio.gather(*requests, return_exceptions=True)
+        for response in responses:
+            if isinstance(response, BaseException) and not isinstance(response, OrangeBankError):
+                raise response
+        if shared is not None:
+            response = responses.pop()
+            if isinstance(response, OrangeBankError):
+                results.update((request_type, response) for request_type in shared_fields)
+            else:
+                # Every field of the reply is cached, not only the requested ones
+                for request_type, value in response.items():
+                    self.cache.store(user_id, request_type, value)
+                    results[request_type] = value
+        for request_type, response in zip(remaining, responses):
+            if not isinstance(response, OrangeBankError):
+                self.cache.store(user_id, request_type, response)
+            results[request_type] = response
+        missing = [request_type for request_type in shared_fields if request_type not in results]
+        if missing:
+            # The shared reply left these out; ask for them one by one
+            results.update(await self._fetch_each(user_id, missing))
+        return results
+
+    async def _fetch_each(self, user_id: int, request_types) -> dict:
+        responses = await asyncio.gather(
+            *(self._fetch_one(user_id, request_type) for request_type in request_types),
+            return_exceptions=True,
+        )
+        results = {}
+        for request_type, response in zip(request_types, responses):
+            if isinstance(response, BaseException) and not isinstance(response, OrangeBankError):
+                raise response
+            if not isinstance(response, OrangeBankError):
+                self.cache.store(user_id, request_type, response)
+            results[request_type] = response
+        return results
+
+    async def _fetch_batched(self, user_id: int, request_types) -> dict:
+        """
+        Adds fields to the batch being collected and returns the values the
+        batch reply carries for them. Fields missing from the reply are left
+        out so they are requested one by one.
+        """
+        batch = self._open_batch
+        if batch is None or (
+            user_id not in batch.fields_by_user
+            and len(batch.fields_by_user) >= config.ORANGE_BANK_BATCH_MAX_USERS
+        ):
+            batch = self._open_batch = RequestBatch()
+            task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        batch.fields_by_user.setdefault(user_id, set()).update(request_types)
+        data = (await asyncio.shield(batch.future)).get(str(user_id), {})
+        results = {}
+        for request_type in request_types:
+            value = data.get(config.ORANGE_BANK_ALL_KEYS[request_type])
+            if value is not None:
+                results[request_type] = value
+        return results
+
+    async def _send_batch(self, batch: RequestBatch):
+        # Let concurrent renders add their fields before the batch is sent
+        await asyncio.sleep(config.ORANGE_BANK_BATCH_WINDOW)
+        if self._open_batch is batch:
+            self._open_batch = None
+        try:
+            content = (await self._exchange(batch.message(), tuple(batch.fields_by_user), "batch")).strip()
+            if not content.startswith("Sure."):
+                logger.error("Unexpected response format from Orange Bank.")
+                raise OrangeBankError("Unexpected response format.")
+            batch.future.set_result(self.parse_response_sections(content))
+        except OrangeBankError as e:
+            batch.future.set_exception(e)
+        except BaseException:
+            batch.future.set_exception(OrangeBankError("An error occurred while communicating with Orange Bank."))
+            raise
+
+    async def _fetch_projected(self, user_id: int) -> dict:
+        """
+        Returns the ob_all value and every field of config.ORANGE_BANK_ALL_KEYS
+        found in one ob_all reply. Fields missing from the reply are left out so
+        they are requested one by one.
+        """
+        content = (await self._round_trip(user_id, "ob_all")).strip()
+        if not content.startswith("Sure."):
+            logger.error("Unexpected response format from Orange Bank.")
+            raise OrangeBankError("Unexpected response format.")
+        data = self.parse_response_fields(content)
+        results = {"ob_all": self.parse_orange_bank_response(content)}
+        for request_type, key in config.ORANGE_BANK_ALL_KEYS.items():
+            value = data.get(key)
+            if value is not None:
+                results[request_type] = value
+        logger.info(f"Received ob_all response from Orange Bank for user_id {user_id}: {results}")
+        return results
+
+    def resolve_routing(self):
+        """
+        Looks up the logs channel requests are posted to and keeps it for
+        later requests. Returns None if it is not visible to the bot.
+        """
+        channel = None
+        if config.ORANGE_BANK_LOGS_CHANNEL_ID:
+            channel = self.bot.get_channel(config.ORANGE_BANK_LOGS_CHANNEL_ID)
+        else:
+            guild = self.bot.get_guild(config.ORANGE_BANK_GUILD_ID)
+            if not guild:
+                logger.error(f"Guild with ID {config.ORANGE_BANK_GUILD_ID} not found.")
+            else:
+                channel = discord.utils.get(guild.text_channels, name=config.ORANGE_BANK_LOGS_CHANNEL)
+        if not channel:
+            logger.error("Logs channel not found in the guild.")
+        self._channel = channel
+        return channel
+
+    # Re-resolve the logs channel whenever it or its guild may have changed
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        if guild.id == config.ORANGE_BANK_GUILD_ID:
+            self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_guild_unavailable(self, guild: discord.Guild):
+        if guild.id == config.ORANGE_BANK_GUILD_ID:
+            self._channel = None
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if after.id == config.ORANGE_BANK_GUILD_ID:
+            self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        if channel.guild.id == config.ORANGE_BANK_GUILD_ID and not self._channel:
+            self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if after.guild.id == config.ORANGE_BANK_GUILD_ID:
+            # A rename may move the "logs" name to or away from this channel
+            self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if self._channel is not None and channel.id == self._channel.id:
+            self.resolve_routing()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """
+        Hands Orange Bank replies to the request waiting for them.
+        """
+        if message.author.id != self.orange_bank_id or not self._pending:
+            return
+        pending = self._match_pending(message)
+        if pending is None:
+            logger.warning(f"Unmatched Orange Bank reply in channel {message.channel.id}")
+            return
+        self._pending.remove(pending)
+        if not pending.future.done():
+            pending.future.set_result(message.content)
+
+    def _match_pending(self, message: discord.Message):
+        candidates = [pending for pending in self._pending if pending.channel_id == message.channel.id]
+        if not candidates:
+            return None
+        # A reply to our request message identifies the request exactly. One
+        # referencing a request that is no longer pending (it timed out) is
+        # late and must not be handed to anyone else.
+        reference = message.reference.message_id if message.reference else None
+        if reference is not None:
+            for pending in candidates:
+                if pending.message_id == reference:
+                    return pending
+            return None
+        # Otherwise match on the uids the reply is about and the fields it
+        # carries, oldest request first. A reply about users nobody is waiting
+        # for is dropped for the same reason.
+        sections = self.parse_response_sections(message.content.strip())
+        if sections:
+            related = [
+                pending for pending in candidates
+                if any(str(user_id) in sections for user_id in pending.user_ids)
+            ]
+            for pending in related:
+                if self._reply_answers(pending, sections):
+                    return pending
+            return related[0] if related else None
+        # Orange Bank answers in order, so a reply with neither goes to the oldest request
+        return candidates[0]
+
+    @staticmethod
+    def _reply_answers(pending: PendingRequest, sections: dict) -> bool:
+        """
+        Whether the sections of a reply look like the answer to ``pending``.
+        """
+        if pending.request_type == "batch":
+            return set(sections) <= {str(user_id) for user_id in pending.user_ids}
+        data = sections.get(str(pending.user_ids[0]), {})
+        if pending.request_type == "ob_all":
+            return sum(key in data for key in config.ORANGE_BANK_ALL_KEYS.values()) > 1
+        return config.ORANGE_BANK_ALL_KEYS.get(pending.request_type) in data
 
 def setup(bot):
     bot.add_cog(OrangeBankCog(bot))
@@ -4,11 +4,16 @@ import discord
 from discord.ext import commands
 from discord.commands import Option
 import logging
-from cogs.filesystem import FileSystem, File, Directory
-from data import load_filesystems, save_filesystems
+from cogs.filesystem import File, Directory, COST_HEAVY
+from data import load_filesystem, save_filesystem, migrate_legacy_filesystems, flusher
+from fs_cache import FilesystemCache
+import config
+import asyncio
+from startup import profiler, wait_until_ready, StillStarting
 import io
 import os
-import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from discord.ui import Modal, InputText
 from discord import InputTextStyle
 
@@ -36,6 +41,12 @@ class NanoModal(Modal):
         ))
 
     async def callback(self, interaction: discord.Interaction):
+        # Wait for any command of this user still running in a worker thread
+        async with self.fs_cog.user_lock(self.user_id):
+            await self.save(interaction)
+        await self.fs_cog.filesystems.enforce_budget()
+
+    async def save(self, interaction: discord.Interaction):
         new_filename = self.children[0].value.strip()
         new_content = self.children[1].value
 
@@ -47,69 +58,18 @@ class NanoModal(Modal):
             return
 
         user_id = self.user_id
-        fs = self.fs_cog.filesystems[user_id]
-
-        old_file = fs.resolve_path(self.filename)
-        old_content_size = 0
-        if old_file and isinstance(old_file, File):
-            old_content_size = old_file.size
-
-        new_content_size = len(new_content.encode('utf-8'))
-
-        size_difference = new_content_size - old_content_size
-
-        if fs.total_size + size_difference > fs.max_size:
-            await interaction.response.send_message(
-                "Cannot save file. Storage limit exceeded.",
-                ephemeral=True
-            )
-            return
+        fs = self.fs_cog.get_filesystem(user_id)
 
-        # Handle filename change
-        if self.filename != new_filename:
-            # Remove old file if it exists
-            if old_file and isinstance(old_file, File):
-                parent_dir = old_file.parent
-                del parent_dir.children[old_file.name]
-                fs.total_size -= old_file.size
-                parent_dir.modified_at = time.time()
-
-        # Check if a file with the new filename already exists
-        existing_file = fs.resolve_path(new_filename)
-        if existing_file and isinstance(existing_file, File):
-            # Update the existing file
-            existing_file.content = new_content.encode('utf-8')
-            existing_file.size = new_content_size
-            existing_file.modified_at = time.time()
-            fs.total_size += size_difference
-        elif existing_file and isinstance(existing_file, Directory):
-            await interaction.response.send_message(
-                f"Cannot save file. A directory with the name '{new_filename}' exists.",
-                ephemeral=True
-            )
+        # A changed filename renames the file: the old entry goes once the new one is written
+        replaces = self.filename if self.filename != new_filename else None
+        error = fs.write_file(new_filename, new_content.encode('utf-8'), replaces)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
-        else:
-            # Create a new file
-            parent_dir = fs.current_dir
-            filename = new_filename
-            if '/' in new_filename:
-                parent_path = os.path.dirname(new_filename)
-                parent_dir = fs.resolve_path(parent_path)
-                filename = os.path.basename(new_filename)
-                if not parent_dir:
-                    await interaction.response.send_message(
-                        f"Cannot save file. Directory '{parent_path}' does not exist.",
-                        ephemeral=True
-                    )
-                    return
-            new_file = File(name=filename, content=new_content.encode('utf-8'))
-            new_file.parent = parent_dir
-            parent_dir.children[filename] = new_file
-            parent_dir.modified_at = time.time()
-            fs.total_size += new_content_size
 
         # Save the filesystem
-        save_filesystems(self.fs_cog.filesystems)
+        save_filesystem(user_id, fs)
+        self.fs_cog.filesystems.update_weight(user_id)
         await interaction.response.send_message(
             f"File '{new_filename}' saved successfully.",
             ephemeral=True
@@ -117,10 +77,56 @@ class NanoModal(Modal):
         logger.info(f"User {interaction.user} saved file: {new_filename}")
 
 class OSExecCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, fast_start=False):
         self.bot = bot
-        # Load per-user filesystems
-        self.filesystems = load_filesystems()
+        # Per-user filesystems are loaded the first time each user needs one
+        # and evicted again when idle and over the memory budget
+        self.filesystems = FilesystemCache(config.FS_CACHE_BUDGET, load_filesystem, flusher)
+        self.ready = asyncio.Event()
+        self._warm_task = None
+        # CPU heavy read-only shell commands run here, off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=config.OS_EXEC_WORKERS, thread_name_prefix="os_exec")
+        # One lock per user with a command running or waiting, so commands never interleave
+        self._user_locks = weakref.WeakValueDictionary()
+        if not fast_start:
+            with profiler.measure("load", "migrate_legacy_filesystems"):
+                migrate_legacy_filesystems()
+            self.ready.set()
+
+    @commands.Cog.listener()
+    async def on_connect(self):
+        if self.ready.is_set() or self._warm_task is not None:
+            return
+        self._warm_task = asyncio.create_task(self.warm_filesystems())
+
+    async def warm_filesystems(self):
+        with profiler.measure("load", "migrate_legacy_filesystems (background)"):
+            await asyncio.to_thread(migrate_legacy_filesystems)
+        self.ready.set()
+
+    async def cog_before_invoke(self, ctx):
+        # In fast-start mode, hold commands until a legacy store has been split
+        await wait_until_ready(ctx, self.ready)
+
+    async def cog_command_error(self, ctx, error):
+        if isinstance(error, StillStarting):
+            return  # The user was already asked to try again
+        logger.error(f"Error in command {ctx.command}: {error}", exc_info=error)
+
+    def cog_unload(self):
+        self._executor.shutdown(wait=False)
+
+    def user_lock(self, user_id):
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    def get_filesystem(self, user_id):
+        """
+        Returns the user's filesystem, loading it from disk or creating it on first use.
+        """
+        return self.filesystems.get(user_id)
 
     @commands.slash_command(
         name="os_exec",
@@ -134,12 +140,19 @@ class OSExecCog(commands.Cog):
     ):
         await ctx.defer(ephemeral=True)
         user_id = str(ctx.user.id)
-        # Ensure the user has a filesystem
-        if user_id not in self.filesystems:
-            self.filesystems[user_id] = FileSystem()
-
-        fs = self.filesystems[user_id]
+        async with self.user_lock(user_id):
+            # Ensure the user has a filesystem and keep it in memory while the command runs
+            fs = self.filesystems.acquire(user_id)
+            try:
+                await self.run_os_command(ctx, user_id, fs, command, file)
+            finally:
+                self.filesystems.release(user_id)
+        await self.filesystems.enforce_budget()
 
+    async def run_os_command(self, ctx, user_id, fs, command, file):
+        """
+        Runs one /os_exec invocation against a filesystem the caller holds.
+        """
         # Handle file upload
         if file is not None:
             # Download the file and add it to the user's filesystem
@@ -161,7 +174,7 @@ class OSExecCog(commands.Cog):
                     response = f"Failed to upload file '{filename}'. It may already exist or exceed storage limits."
                     logger.warning(f"User {ctx.user} failed to upload file: {filename}")
                 await ctx.respond(response, ephemeral=True)
-                save_filesystems(self.filesystems)
+                save_filesystem(user_id, fs)
                 return
             except Exception as e:
                 logger.error(f"Failed to read uploaded file: {e}")
@@ -170,7 +183,7 @@ class OSExecCog(commands.Cog):
                 )
                 return
 
-        output = fs.execute_command(command)
+        output = await self.execute(fs, command)
 
         if isinstance(output, tuple):
             # Handle 'download' command
@@ -201,7 +214,23 @@ class OSExecCog(commands.Cog):
                 )
 
         # Save the filesystem
-        save_filesystems(self.filesystems)
+        save_filesystem(user_id, fs)
+
+    async def execute(self, fs, command):
+        """
+        Runs a shell command line. Heavy commands that only read the filesystem
+        run in a worker thread so they cannot stall the gateway; the caller
+        holds the user's lock, so nothing else touches the filesystem meanwhile.
+        """
+        prepared = fs.prepare_command(command)
+        if isinstance(prepared, str):
+            return prepared
+        shell_command, args = prepared
+        if shell_command.cost == COST_HEAVY and not shell_command.mutates:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fs.run_command, shell_command, args, config.OS_EXEC_CPU_LIMIT
+            )
+        return fs.run_command(shell_command, args, config.OS_EXEC_CPU_LIMIT)
 
     @commands.slash_command(
         name="nano",
@@ -213,10 +242,21 @@ class OSExecCog(commands.Cog):
         filename: Option(str, "The name of the file to edit.")
     ):
         user_id = str(ctx.user.id)
-        if user_id not in self.filesystems:
-            self.filesystems[user_id] = FileSystem()
-        fs = self.filesystems[user_id]
+        # Reading the file's content must not overlap a command of this user
+        # running in a worker thread
+        async with self.user_lock(user_id):
+            # Opening the editor may load the filesystem and the file's content
+            fs = self.filesystems.acquire(user_id)
+            try:
+                await self.open_editor(ctx, user_id, fs, filename)
+            finally:
+                self.filesystems.release(user_id)
+        await self.filesystems.enforce_budget()
 
+    async def open_editor(self, ctx, user_id, fs, filename):
+        """
+        Shows the nano modal for a file of a filesystem the caller holds.
+        """
         # Try to get the file
         file = fs.resolve_path(filename)
         content = ''
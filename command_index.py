@@ -0,0 +1,109 @@
+# command_index.py
+
+class PublicCommandIndex:
+    """
+    Maps every public command name to the users that own a command with that
+    name, so pc! resolution and the global name limit do not scan every user.
+    """
+
+    def __init__(self):
+        self._by_name = {}  # name -> {user_id: command}, in insertion order
+        self._names_by_user = {}  # user_id -> set of public names
+
+    def rebuild(self, custom_commands):
+        self._by_name.clear()
+        self._names_by_user.clear()
+        for user_id, user_cmds in custom_commands.items():
+            self.update_user(user_id, user_cmds)
+
+    def update_user(self, user_id, user_cmds):
+        """
+        Re-syncs the entries of one user after their commands changed.
+        """
+        for name in self._names_by_user.pop(user_id, ()):
+            owners = self._by_name.get(name)
+            if owners is not None:
+                owners.pop(user_id, None)
+                if not owners:
+                    del self._by_name[name]
+        names = set()
+        for cmd in (user_cmds or {}).get("public", []):
+            self._by_name.setdefault(cmd['name'], {})[user_id] = cmd
+            names.add(cmd['name'])
+        if names:
+            self._names_by_user[user_id] = names
+
+    def count(self, name):
+        return len(self._by_name.get(name, ()))
+
+    def find(self, name, limit=5):
+        """
+        Returns up to ``limit`` (user_id, command) pairs for the public name.
+        """
+        owners = self._by_name.get(name, {})
+        return list(owners.items())[:limit]
+
+class CommandCollection:
+    """
+    One user's private or public commands keyed by name. Iterating yields the
+    commands in insertion order, which is the order they are displayed in.
+    Stored on disk as the plain list of command dicts used before.
+    """
+
+    def __init__(self, commands=()):
+        self._commands = {}
+        for cmd in commands:
+            self._commands[cmd['name']] = cmd
+
+    def __iter__(self):
+        return iter(self._commands.values())
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def get(self, name, default=None):
+        return self._commands.get(name, default)
+
+    def add(self, command):
+        self._commands[command['name']] = command
+
+    def remove(self, name):
+        return self._commands.pop(name, None)
+
+    def to_list(self):
+        return list(self._commands.values())
+
+SCOPES = ("private", "public")
+
+def wrap_user_commands(user_cmds):
+    """
+    Turns a stored {"private": [...], "public": [...]} record into collections.
+    """
+    record = dict(user_cmds)
+    for scope in SCOPES:
+        record[scope] = CommandCollection(user_cmds.get(scope, []))
+    return record
+
+def unwrap_user_commands(user_cmds):
+    """
+    Returns the JSON layout of a record, with collections turned back into lists.
+    """
+    return {
+        key: value.to_list() if isinstance(value, CommandCollection) else value
+        for key, value in user_cmds.items()
+    }
+
+def user_commands(custom_commands, user_id, create=False):
+    """
+    Returns a user's command record. Missing users get an empty record, which
+    is only stored in ``custom_commands`` when ``create`` is set.
+    """
+    record = custom_commands.get(user_id)
+    if record is None:
+        record = {scope: CommandCollection() for scope in SCOPES}
+        if create:
+            custom_commands[user_id] = record
+    return record
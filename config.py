@@ -1,5 +1,72 @@
 # config.py
 COMMANDS_FILE = "custom_commands.json"
+COMMANDS_DIR = "custom_commands"  # One JSON shard per user
+COMMANDS_BACKEND = "json"  # "json" (per-user shards) or "sqlite"
+COMMANDS_DB = "custom_commands.db"  # Used by the sqlite backend
+
+# Seconds a slash command waits for the background load in fast-start mode
+# before the user is asked to try again (Discord expects an answer within 3 s)
+STARTUP_COMMAND_WAIT = 2.0
+
+# Write-behind persistence
+FLUSH_DELAY = 2.0  # Seconds to coalesce mutations before writing to disk
+FLUSH_MAX_BATCH = 64  # Maximum number of records written per flusher call
+
+# Virtual filesystems kept in memory; idle ones are evicted beyond this many bytes
+FS_CACHE_BUDGET = 64 * 1024 * 1024
+BLOBS_DIR = "blobs"  # Content-addressed storage for virtual file contents
+JOURNAL_COMPACT_EVERY = 200  # Filesystem log entries before compacting into a snapshot
+BLOB_GC_EVERY = 50  # Snapshots written between sweeps of unreferenced blobs
+BLOB_GC_GRACE = 3600  # Seconds a blob is kept after it was last written, even if unreferenced
+OS_EXEC_WORKERS = 4  # Threads running heavy /os_exec commands
+OS_EXEC_CPU_LIMIT = 2.0  # Seconds of CPU time a shell command may use before it is stopped
+
+# Compiled command outputs kept in memory
+TEMPLATE_CACHE_SIZE = 4096
+
+# Formatted user placeholder values, least recently used members are evicted first
+MEMBER_CACHE_SIZE = 10000  # (guild, user) entries
+MEMBER_CACHE_STATS_EVERY = 1000  # Log the cache hit rate every this many lookups
+
+# Orange Bank requests
+ORANGE_BANK_USER_ID = 1090982396574306304  # The Orange Bank bot
+ORANGE_BANK_GUILD_ID = 1079761115636043926  # Guild with the channel requests are posted to
+ORANGE_BANK_LOGS_CHANNEL_ID = None  # Channel ID; if None, the channel below is looked up by name
+ORANGE_BANK_LOGS_CHANNEL = "logs"
+ORANGE_BANK_TIMEOUT = 5.0  # Seconds to send a request and get its reply before giving up
+ORANGE_BANK_RENDER_BUDGET = 3.0  # Seconds a render waits for its ob_ fields before using fallbacks
+ORANGE_BANK_BREAKER_FAILURES = 5  # Failed requests in a row before requests stop being sent
+ORANGE_BANK_BREAKER_RESET = 30.0  # Seconds before a probe request is let through again
+# Seconds an Orange Bank value is served from the cache without asking again
+ORANGE_BANK_TTL = {
+    "ob_balance": 30,
+    "ob_inventory": 60,
+    "ob_streak": 300,
+    "ob_messages": 60,
+    "ob_position_in_leaderboard": 120,
+    "ob_daily_leaderboard_stats": 120,
+    "ob_balance_leaderboard_stats": 120,
+}
+ORANGE_BANK_DEFAULT_TTL = 60  # Fields not listed above
+ORANGE_BANK_STALE_FOR = 600  # Seconds an expired value is still served while it is refreshed
+ORANGE_BANK_CACHE_STATS_EVERY = 500  # Log the cache hit rate every this many lookups
+# Batch requests: fields of every user asked for within the window go out as one
+# "#feedback batch" message with a "<uid> <field> <field>..." line per user.
+# Only enable this with an Orange Bank that answers that format (one UID section per user).
+ORANGE_BANK_BATCH_REQUESTS = False
+ORANGE_BANK_BATCH_WINDOW = 0.05  # Seconds to collect fields before sending a batch
+ORANGE_BANK_BATCH_MAX_USERS = 20  # Users per batch message, keeps it under Discord's length limit
+# Key of each ob_ field in the reply to an ob_all request (keys are lowercased).
+# Fields listed here are read from one ob_all reply when a command uses several.
+ORANGE_BANK_ALL_KEYS = {
+    "ob_balance": "balance",
+    "ob_inventory": "inventory",
+    "ob_streak": "streak",
+    "ob_messages": "messages",
+    "ob_position_in_leaderboard": "position in leaderboard",
+    "ob_daily_leaderboard_stats": "daily leaderboard stats",
+    "ob_balance_leaderboard_stats": "balance leaderboard stats",
+}
 
 PLACEHOLDERS = {
     "[]": {
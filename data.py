@@ -2,14 +2,26 @@
 
 import json
 import os
-from config import COMMANDS_FILE
+from config import COMMANDS_FILE, COMMANDS_DIR
 import logging
-from cogs.filesystem import FileSystem
 from datetime import datetime
 import shutil
+import copy
+import atexit
+from flusher import WriteBehindFlusher
+from command_index import PublicCommandIndex, wrap_user_commands, unwrap_user_commands
+import blobstore
+import config
 
 logger = logging.getLogger('CustomCommandBot')
 
+# Shared write-behind queue for all persistence; flushed on shutdown
+flusher = WriteBehindFlusher(config.FLUSH_DELAY, config.FLUSH_MAX_BATCH)
+atexit.register(flusher.close)
+
+# Public command name -> owners, kept in sync by load_commands and save_commands
+public_index = PublicCommandIndex()
+
 # Backup the existing custom_commands.json
 def backup_commands_file():
     if os.path.exists(COMMANDS_FILE):
@@ -47,92 +59,364 @@ def migrate_commands(data):
                 logger.info(f"Adjusted commands for user ID {user_id} to include 'private' and 'public' keys.")
     return migrated
 
+# Users whose command records changed since the last save
+_dirty_command_users = set()
+
+def mark_commands_dirty(user_id):
+    """
+    Flags a user's command record as changed so the next save rewrites its shard.
+    """
+    _dirty_command_users.add(str(user_id))
+
+def _command_shard_path(user_id, directory=COMMANDS_DIR):
+    return os.path.join(directory, f"{user_id}.json")
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def _write_command_shard(user_id, user_cmds, directory=COMMANDS_DIR):
+    path = _command_shard_path(user_id, directory)
+    if not user_cmds or not (user_cmds.get("private") or user_cmds.get("public")):
+        # Nothing left to store for this user
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    _write_json_atomic(path, user_cmds)
+
+def _load_legacy_commands():
+    with open(COMMANDS_FILE, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            logger.error(
+                "Failed to decode JSON from custom_commands.json. "
+                "Initializing empty commands."
+            )
+            return {}
+
+    # Check if migration is needed
+    # If any user has a list as their commands, migration is required
+    needs_migration = False
+    for cmds in data.values():
+        if isinstance(cmds, list):
+            needs_migration = True
+            break
+
+    if needs_migration:
+        logger.info("Migration from old format to new format is required.")
+        migrated = migrate_commands(data)
+        if not migrated:
+            logger.info("No migration was necessary.")
+    return data
+
+def _split_legacy_commands(data):
+    """
+    Writes every user of the legacy single-file store into its own shard.
+    Shards are built in a temporary directory that is renamed into place, so
+    an interrupted split is simply retried on the next start.
+    """
+    backup_commands_file()
+    tmp_dir = f"{COMMANDS_DIR}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for user_id, user_cmds in data.items():
+        _write_command_shard(user_id, user_cmds, directory=tmp_dir)
+    os.replace(tmp_dir, COMMANDS_DIR)
+    logger.info(f"Split {COMMANDS_FILE} into {len(data)} per-user shards in {COMMANDS_DIR}/.")
+
+_sqlite_store = None
+
+def _get_sqlite_store():
+    """
+    Returns the SQLite command store, or None when the JSON backend is configured.
+    """
+    global _sqlite_store
+    if config.COMMANDS_BACKEND != "sqlite":
+        return None
+    if _sqlite_store is None:
+        from sqlite_store import SQLiteCommandStore
+        _sqlite_store = SQLiteCommandStore(config.COMMANDS_DB)
+    return _sqlite_store
+
 # Load existing custom commands or initialize empty dictionary
 def load_commands():
-    if os.path.exists(COMMANDS_FILE):
-        with open(COMMANDS_FILE, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                logger.error(
-                    "Failed to decode JSON from custom_commands.json. "
-                    "Initializing empty commands."
-                )
-                data = {}
-
-        # Check if migration is needed
-        # If any user has a list as their commands, migration is required
-        needs_migration = False
-        for cmds in data.values():
-            if isinstance(cmds, list):
-                needs_migration = True
-                break
-
-        if needs_migration:
-            logger.info("Migration from old format to new format is required.")
-            backup_commands_file()
-            migrated = migrate_commands(data)
-            if migrated:
-                # Save the migrated data
-                save_commands(data)
-                logger.info("Migration completed and changes saved to custom_commands.json.")
-            else:
-                logger.info("No migration was necessary.")
+    data = {
+        user_id: wrap_user_commands(user_cmds)
+        for user_id, user_cmds in _load_commands_from_backend().items()
+    }
+    public_index.rebuild(data)
+    return data
+
+def _load_commands_from_backend():
+    store = _get_sqlite_store()
+    if store is not None:
+        if store.is_empty():
+            # First start on SQLite: import whatever the JSON backend holds
+            data = _load_json_commands()
+            if data:
+                store.import_commands(data)
+                logger.info(f"Imported commands for {len(data)} user(s) into {config.COMMANDS_DB}.")
+        return store.load_all()
+    return _load_json_commands()
 
+def _load_json_commands():
+    if os.path.isdir(COMMANDS_DIR):
+        data = {}
+        for entry in os.listdir(COMMANDS_DIR):
+            if not entry.endswith(".json"):
+                continue
+            user_id = entry[:-len(".json")]
+            try:
+                with open(os.path.join(COMMANDS_DIR, entry), "r") as f:
+                    data[user_id] = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Failed to load command shard {entry}: {e}")
+        return data
+    elif os.path.exists(COMMANDS_FILE):
+        data = _load_legacy_commands()
+        try:
+            _split_legacy_commands(data)
+        except Exception as e:
+            logger.error(f"Failed to split {COMMANDS_FILE} into shards: {e}")
         return data
     else:
         return {}
 
+def _command_shard_job(custom_commands, user_id):
+    def prepare():
+        # Snapshot on the event loop; encoding and writing happen in the flusher thread
+        user_cmds = custom_commands.get(user_id)
+        snapshot = copy.deepcopy(unwrap_user_commands(user_cmds)) if user_cmds else None
+
+        def write():
+            store = _get_sqlite_store()
+            if store is not None:
+                store.save_user(user_id, snapshot)
+                return
+            os.makedirs(COMMANDS_DIR, exist_ok=True)
+            _write_command_shard(user_id, snapshot)
+        return write
+    return prepare
+
 # Save custom commands to file
-def save_commands(custom_commands):
-    try:
-        with open(COMMANDS_FILE, "w") as f:
-            json.dump(custom_commands, f, indent=4)
-        logger.info("Custom commands saved.")
-    except Exception as e:
-        logger.error(f"Failed to save custom commands: {e}")
+def save_commands(custom_commands, user_id=None):
+    """
+    Persists custom commands one shard per user. Only users marked dirty
+    (including ``user_id`` when given) are rewritten, so the write cost follows
+    the size of the change. With nothing marked, every shard is rewritten.
+    Writes are handed to the write-behind flusher and coalesced.
+    """
+    if user_id is not None:
+        mark_commands_dirty(user_id)
+    user_ids = set(_dirty_command_users) if _dirty_command_users else set(custom_commands)
+    _dirty_command_users.clear()
+    for uid in user_ids:
+        public_index.update_user(uid, custom_commands.get(uid))
+        flusher.schedule(("commands", uid), _command_shard_job(custom_commands, uid))
+
+def find_public_commands(command_name, limit=5):
+    """
+    Returns up to ``limit`` (user_id, command) pairs for public commands named ``command_name``.
+    """
+    return public_index.find(command_name, limit)
 
 # New functions for filesystem
-FILESYSTEMS_FILE = "filesystems.json"
+FILESYSTEMS_FILE = "filesystems.json"  # Legacy single-file store
+FILESYSTEMS_DIR = "filesystems"  # One JSON file per user
 
-def load_filesystems():
-    if os.path.exists(FILESYSTEMS_FILE):
+def _filesystem_path(user_id):
+    return os.path.join(FILESYSTEMS_DIR, f"{user_id}.json")
+
+def migrate_legacy_filesystems():
+    """
+    Splits the legacy filesystems.json into per-user files. Only the raw JSON
+    is copied; no FileSystem objects are built. Runs once, before the
+    per-user directory exists.
+    """
+    if os.path.isdir(FILESYSTEMS_DIR) or not os.path.exists(FILESYSTEMS_FILE):
+        return
+    try:
         with open(FILESYSTEMS_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Failed to read {FILESYSTEMS_FILE} for migration: {e}")
+        return
+    tmp_dir = f"{FILESYSTEMS_DIR}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for user_id, fs_data in data.items():
+        _write_json_atomic(os.path.join(tmp_dir, f"{user_id}.json"), fs_data)
+    os.replace(tmp_dir, FILESYSTEMS_DIR)
+    logger.info(f"Split {FILESYSTEMS_FILE} into {len(data)} per-user files in {FILESYSTEMS_DIR}/.")
+
+def _journal_path(user_id):
+    return os.path.join(FILESYSTEMS_DIR, f"{user_id}.log")
+
+def load_filesystem(user_id):
+    """
+    Loads one user's filesystem, or returns None if they do not have one yet.
+    The last snapshot is loaded first and the mutation log is replayed on top.
+    """
+    snapshot_path = _filesystem_path(user_id)
+    journal_path = _journal_path(user_id)
+    if not os.path.exists(snapshot_path) and not os.path.exists(journal_path):
+        return None
+    # Imported here so loading commands does not pull in the filesystem module
+    from cogs.filesystem import FileSystem
+    fs = FileSystem()
+    try:
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r") as f:
+                fs.from_dict(json.load(f))
+            fs.entries_since_snapshot = 0
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Failed to load filesystem for user {user_id}: {e}")
+        return None
+
+    entries = []
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash can leave a partial last line behind
+                    logger.warning(f"Skipping unreadable journal entry for user {user_id}.")
+    fs.replay(entries)
+    if fs.entries_since_snapshot is not None:
+        fs.entries_since_snapshot = len(entries)
+    return fs
+
+# Snapshots written since unreferenced blobs were last swept
+_snapshots_since_gc = 0
+# Blobs referenced by each user's saved filesystem; filled by one scan of
+# FILESYSTEMS_DIR on first use and kept up to date by the flusher thread
+_blob_references = None
+
+def save_filesystem(user_id, fs):
+    """
+    Persists one user's filesystem. Usually this appends the new journal
+    entries to the user's log. Once the log holds JOURNAL_COMPACT_EVERY
+    entries, or no snapshot exists yet, a snapshot is written and the log is
+    truncated. Every BLOB_GC_EVERY snapshots, blobs no longer referenced by
+    any user are deleted.
+    """
+    def prepare():
+        global _snapshots_since_gc
+        entries, fs.journal = fs.journal, []
+        if fs.entries_since_snapshot is None or fs.entries_since_snapshot + len(entries) >= config.JOURNAL_COMPACT_EVERY:
+            data = fs.to_dict()
+            fs.entries_since_snapshot = 0
+            _snapshots_since_gc += 1
+            collect = _snapshots_since_gc >= config.BLOB_GC_EVERY
+            if collect:
+                _snapshots_since_gc = 0
+
+            def write():
+                # Contents first, so the tree never references a missing blob
+                blobstore.write_staged()
+                os.makedirs(FILESYSTEMS_DIR, exist_ok=True)
+                # The snapshot records journal_seq, so a crash before the log is
+                # truncated only leaves entries that replay skips
+                _write_json_atomic(_filesystem_path(user_id), data)
+                open(_journal_path(user_id), "w").close()
+                logger.info(f"Filesystem snapshot saved for user {user_id}.")
+                references = _get_blob_references()
+                if references is not None:
+                    references.replace(user_id, _snapshot_blobs(data))
+                    if collect:
+                        collect_blob_garbage(references)
+        else:
+            fs.entries_since_snapshot += len(entries)
+
+            def write():
+                blobstore.write_staged()
+                os.makedirs(FILESYSTEMS_DIR, exist_ok=True)
+                with open(_journal_path(user_id), "a") as f:
+                    f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                references = _get_blob_references()
+                if references is not None:
+                    references.add(user_id, _entry_blobs(entries))
+
+        def write_or_resnapshot():
             try:
-                data = json.load(f)
-                # Convert data back to FileSystem objects
-                filesystems = {}
-                for user_id, fs_data in data.items():
-                    fs = FileSystem()
-                    fs.from_dict(fs_data)
-                    filesystems[user_id] = fs
-                return filesystems
-            except json.JSONDecodeError:
-                logger.error(
-                    "Failed to decode JSON from filesystems.json. "
-                    "Initializing empty filesystems."
-                )
-                return {}
-    else:
-        return {}
+                write()
+            except Exception:
+                # The entries are no longer in fs.journal and later ones would
+                # replay without them, so the next save writes a full snapshot
+                fs.entries_since_snapshot = None
+                raise
+        return write_or_resnapshot
+    flusher.schedule(("filesystem", user_id), prepare)
+
+def _snapshot_blobs(data):
+    referenced = set()
+    stack = [data['root']]
+    while stack:
+        node = stack.pop()
+        if 'children' in node:
+            stack.extend(node['children'].values())
+        elif 'blob' in node:
+            referenced.add(node['blob'])
+    return referenced
 
-def save_filesystems(filesystems):
-    data = {}
-    for user_id, fs in filesystems.items():
-        data[user_id] = fs.to_dict()
+def _entry_blobs(entries):
+    # Log entries are [seq, op, *args]; 'write' carries (path, blob)
+    return {entry[3] for entry in entries if entry[1] == 'write'}
+
+def _get_blob_references():
+    """
+    Returns the blob references of all users, scanning every snapshot and log
+    once the first time. Returns None (no sweeping) if a snapshot cannot be read.
+    """
+    global _blob_references
+    if _blob_references is not None:
+        return _blob_references if _blob_references is not False else None
+    references = blobstore.BlobReferences()
+    for name in os.listdir(FILESYSTEMS_DIR):
+        path = os.path.join(FILESYSTEMS_DIR, name)
+        user_id, ext = os.path.splitext(name)
+        try:
+            if ext == ".json":
+                with open(path, "r") as f:
+                    references.add(user_id, _snapshot_blobs(json.load(f)))
+            elif ext == ".log":
+                entries = []
+                with open(path, "r") as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue  # Skipped by replay as well
+                references.add(user_id, _entry_blobs(entries))
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            logger.error(f"Not sweeping blobs, failed to read {path}: {e}")
+            _blob_references = False
+            return None
+    # Blobs left behind before references were tracked
+    references.candidates = blobstore.stored_blobs() - references.digests()
+    _blob_references = references
+    return references
+
+def collect_blob_garbage(references):
+    """
+    Deletes blobs that no snapshot or log references any more, e.g. the old
+    content of overwritten or removed files. Runs on the flusher thread after
+    a snapshot, so no tree is written meanwhile; only blobs whose reference
+    count dropped to zero are looked at.
+    """
     try:
-        with open(FILESYSTEMS_FILE, "w") as f:
-            json.dump(data, f, indent=4)
-        logger.info("Filesystems saved.")
-    except Exception as e:
-        logger.error(f"Failed to save filesystems: {e}")
+        removed, freed = blobstore.collect_garbage(references, config.BLOB_GC_GRACE)
+    except OSError as e:
+        logger.error(f"Blob sweep failed: {e}")
+        return
+    logger.info(f"Blob sweep: {removed} unreferenced blob(s) removed, {freed} bytes freed, {len(references)} in use.")
 
 def count_global_public_commands(command_name):
     """
     Counts the number of public commands with the given name across all users.
     """
-    count = 0
-    for user_cmds in load_commands().values():
-        public_cmds = user_cmds.get("public", [])
-        count += sum(1 for cmd in public_cmds if cmd['name'] == command_name)
-    return count
+    return public_index.count(command_name)
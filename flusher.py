@@ -0,0 +1,131 @@
+# flusher.py
+
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('CustomCommandBot')
+
+class WriteBehindFlusher:
+    """
+    Coalesces persistence jobs and runs their encoding and disk writes off the event loop.
+
+    A job is scheduled under a key; rescheduling a key that is still pending
+    replaces the older job, so a burst of mutations collapses into one write.
+    Each job is a ``prepare`` callable that runs on the event loop, takes a
+    snapshot of the state and returns a ``write`` callable for the worker thread.
+    A job whose write raises is scheduled again, so a fresh snapshot is
+    written on the next flush.
+    """
+
+    def __init__(self, delay, max_batch):
+        self.delay = delay  # Seconds to wait for more mutations before writing
+        self.max_batch = max_batch  # Jobs handed to the worker per write call
+        self._pending = {}  # key -> prepare callable, in scheduling order
+        # Key -> number of its snapshots being written; flush() can run more
+        # than once at a time, so a key can be in several batches
+        self._inflight = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="flusher")
+        self._task = None
+        self._closed = False
+
+    def schedule(self, key, prepare):
+        self._pending.pop(key, None)
+        self._pending[key] = prepare
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self._closed:
+            # No event loop to defer to (startup migration, shutdown): write now
+            self.flush_sync()
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def is_pending(self, key):
+        """
+        Returns True while a job for ``key`` is queued or being written.
+        """
+        return key in self._pending or key in self._inflight
+
+    async def _run(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self):
+        """
+        Writes every pending job now, one batch at a time.
+        """
+        loop = asyncio.get_running_loop()
+        failed = []
+        while self._pending:
+            keys, writes = self._prepare_batch()
+            try:
+                failed += await loop.run_in_executor(self._executor, self._write_batch, writes)
+            finally:
+                self._finish_batch(keys)
+        if failed:
+            # Retried after the delay rather than right away, e.g. while the disk is full
+            for key, prepare in failed:
+                self._pending.setdefault(key, prepare)
+            if self._task is None or self._task.done() or self._task is asyncio.current_task():
+                self._task = loop.create_task(self._run())
+
+    def _prepare_batch(self):
+        keys = list(self._pending)[:self.max_batch]
+        writes = []
+        for key in keys:
+            prepare = self._pending.pop(key)
+            try:
+                writes.append((key, prepare, prepare()))
+            except Exception as e:
+                logger.error(f"Failed to snapshot {key} for saving: {e}")
+        self._inflight.update(keys)
+        return keys, writes
+
+    def _finish_batch(self, keys):
+        # Subtracting drops the keys whose last batch this was
+        self._inflight -= Counter(keys)
+
+    @staticmethod
+    def _write_batch(writes):
+        """
+        Runs the writes of a batch and returns (key, prepare) of those that failed.
+        """
+        failed = []
+        for key, prepare, write in writes:
+            try:
+                write()
+            except Exception as e:
+                logger.error(f"Failed to write {key}: {e}")
+                failed.append((key, prepare))
+        return failed
+
+    def flush_sync(self):
+        """
+        Writes every pending job on the calling thread. Failed writes are
+        only logged, as there is no later flush to retry them.
+        """
+        while self._pending:
+            keys, writes = self._prepare_batch()
+            try:
+                self._write_batch(writes)
+            finally:
+                self._finish_batch(keys)
+
+    def close(self):
+        """
+        Waits for in-flight writes, then flushes everything still pending.
+        Safe to call more than once; used on shutdown.
+        """
+        if self._task is not None and not self._task.done():
+            try:
+                self._task.cancel()
+            except RuntimeError:
+                pass  # The event loop is already closed
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        self.flush_sync()
+        logger.info("Pending writes flushed.")
@@ -0,0 +1,137 @@
+# fs_cache.py
+
+import logging
+from collections import OrderedDict
+from cogs.filesystem import FileSystem
+
+logger = logging.getLogger('CustomCommandBot')
+
+class FilesystemCache:
+    """
+    Keeps recently used per-user filesystems in memory within a byte budget.
+
+    Filesystems are loaded on a miss and kept in least-recently-used order.
+    When the total weight goes over the budget, idle filesystems are flushed
+    through the write-behind flusher and evicted, oldest first. A filesystem
+    is idle when no command holds it, none of its writes are pending and
+    everything it recorded has reached the disk.
+    An evicted filesystem is loaded again on its next use.
+    """
+
+    def __init__(self, budget, loader, flusher):
+        self.budget = budget  # Bytes
+        self.loader = loader  # user_id -> FileSystem or None
+        self.flusher = flusher
+        self._entries = OrderedDict()  # user_id -> FileSystem, least recently used first
+        self._weights = {}  # user_id -> bytes
+        self._in_use = {}  # user_id -> number of holders
+        self.total_weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """
+        Returns the user's filesystem, loading it from disk or creating it on a miss.
+        """
+        fs = self._entries.get(user_id)
+        if fs is not None:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return fs
+        self.misses += 1
+        fs = self.loader(user_id) or FileSystem()
+        self._entries[user_id] = fs
+        self.update_weight(user_id)
+        return fs
+
+    def acquire(self, user_id):
+        """
+        Returns the user's filesystem and keeps it from being evicted until release().
+        """
+        fs = self.get(user_id)
+        self._in_use[user_id] = self._in_use.get(user_id, 0) + 1
+        return fs
+
+    def release(self, user_id):
+        remaining = self._in_use.get(user_id, 0) - 1
+        if remaining > 0:
+            self._in_use[user_id] = remaining
+        else:
+            self._in_use.pop(user_id, None)
+        self.update_weight(user_id)
+
+    def update_weight(self, user_id):
+        """
+        Re-measures a filesystem after it changed.
+        """
+        fs = self._entries.get(user_id)
+        if fs is None:
+            return
+        weight = fs.memory_weight()
+        self.total_weight += weight - self._weights.get(user_id, 0)
+        self._weights[user_id] = weight
+
+    def _is_idle(self, user_id):
+        return (
+            user_id not in self._in_use
+            and not self.flusher.is_pending(("filesystem", user_id))
+            and not self._has_unsaved_changes(self._entries[user_id])
+        )
+
+    @staticmethod
+    def _has_unsaved_changes(fs):
+        # Mutations not handed to a save yet, or a failed save that left the
+        # disk behind and is waiting for the next save to write a snapshot
+        return bool(fs.journal) or (fs.entries_since_snapshot is None and fs.journal_seq > 0)
+
+    def _candidates(self):
+        # Least recently used filesystems that would bring the cache back under budget
+        excess = self.total_weight - self.budget
+        victims = []
+        for user_id in self._entries:
+            if excess <= 0:
+                break
+            if user_id in self._in_use:
+                continue
+            victims.append(user_id)
+            excess -= self._weights.get(user_id, 0)
+        return victims
+
+    async def enforce_budget(self):
+        """
+        Flushes and evicts idle filesystems until the cache fits its budget.
+        """
+        if self.total_weight <= self.budget:
+            return
+        victims = self._candidates()
+        if any(not self._is_idle(user_id) for user_id in victims):
+            # Get pending writes to disk first so nothing is lost on eviction
+            await self.flusher.flush()
+        for user_id in victims:
+            if user_id in self._entries and self._is_idle(user_id):
+                self._evict(user_id)
+
+    def _evict(self, user_id):
+        del self._entries[user_id]
+        self.total_weight -= self._weights.pop(user_id, 0)
+        self.evictions += 1
+        logger.info(f"Evicted filesystem of user {user_id} from memory. Cache stats: {self.stats()}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'weight': self.total_weight,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -1,4 +1,5 @@
 # main.py
+from startup import profiler
 import discord
 from discord.ext import commands
 import dotenv
@@ -12,11 +13,19 @@ logger = logging.getLogger('CustomCommandBot')
 # Load environment variables
 dotenv.load_dotenv()
 
+# Fast start: connect to the gateway first and load stored state in the background
+FAST_START = os.getenv("FAST_START", "").lower() in ("1", "true", "yes")
+
 # Import Cogs
-from cogs.commands import CommandsCog
-from cogs.events import EventsCog
-from cogs.os_exec import OSExecCog
-from cogs.orange_bank import OrangeBankCog  # New Cog
+with profiler.measure("import", "cogs.commands"):
+    from cogs.commands import CommandsCog
+with profiler.measure("import", "cogs.events"):
+    from cogs.events import EventsCog
+with profiler.measure("import", "cogs.os_exec"):
+    from cogs.os_exec import OSExecCog
+with profiler.measure("import", "cogs.orange_bank"):
+    from cogs.orange_bank import OrangeBankCog  # New Cog
+from data import flusher
 
 # Define intents
 intents = discord.Intents.default()
@@ -27,10 +36,26 @@ intents.members = True  # Needed for accessing member information
 bot = commands.Bot(intents=intents, command_prefix="!", help_command=None)
 
 # Load Cogs
-bot.add_cog(CommandsCog(bot))
-bot.add_cog(EventsCog(bot))
-bot.add_cog(OSExecCog(bot))  # Existing Cog
-bot.add_cog(OrangeBankCog(bot))  # Load OrangeBankCog
+with profiler.measure("cog init", "CommandsCog"):
+    bot.add_cog(CommandsCog(bot, fast_start=FAST_START))
+with profiler.measure("cog init", "EventsCog"):
+    bot.add_cog(EventsCog(bot))
+with profiler.measure("cog init", "OSExecCog"):
+    bot.add_cog(OSExecCog(bot, fast_start=FAST_START))  # Existing Cog
+with profiler.measure("cog init", "OrangeBankCog"):
+    bot.add_cog(OrangeBankCog(bot))  # Load OrangeBankCog
+
+@bot.listen("on_ready")
+async def report_startup():
+    # on_ready fires again after reconnects; report the cold start only
+    if profiler.reported:
+        return
+    profiler.report()
+    if FAST_START:
+        # The background loads finish after on_ready; report again with their timings
+        await bot.commands_ready.wait()
+        await bot.get_cog("OSExecCog").ready.wait()
+        profiler.report()
 
 # Run the bot
 if __name__ == "__main__":
@@ -38,4 +63,8 @@ if __name__ == "__main__":
     if not TOKEN:
         logger.error("TOKEN environment variable not set.")
         exit(1)
-    bot.run(TOKEN)
+    try:
+        bot.run(TOKEN)
+    finally:
+        # Make sure coalesced writes reach the disk before exiting
+        flusher.close()
@@ -4,6 +4,8 @@ import discord
 from discord.ui import Modal, InputText
 from datetime import datetime
 from data import save_commands
+from command_index import user_commands
+from templates import get_template, invalidate_template
 import logging
 
 logger = logging.getLogger('CustomCommandBot')
@@ -52,14 +54,10 @@ class CreateCommandModal(Modal):
         custom_commands = self.bot.custom_commands
 
         # Initialize user's command categories if not present
-        if user_id not in custom_commands:
-            custom_commands[user_id] = {
-                "private": [],
-                "public": []
-            }
+        cmds = user_commands(custom_commands, user_id, create=True)
 
         # Check total number of commands across both categories
-        total_commands = len(custom_commands[user_id].get("private", [])) + len(custom_commands[user_id].get("public", []))
+        total_commands = len(cmds["private"]) + len(cmds["public"])
         if total_commands >= 10:
             await interaction.response.send_message(
                 "You can only have up to 10 custom commands.",
@@ -76,13 +74,12 @@ class CreateCommandModal(Modal):
             return
 
         # Check for duplicate command names across both categories
-        for cmd in custom_commands[user_id].get("private", []) + custom_commands[user_id].get("public", []):
-            if cmd["name"] == command_name:
-                await interaction.response.send_message(
-                    "You already have a command with that name.",
-                    ephemeral=True
-                )
-                return
+        if command_name in cmds["private"] or command_name in cmds["public"]:
+            await interaction.response.send_message(
+                "You already have a command with that name.",
+                ephemeral=True
+            )
+            return
 
         command_output = self.children[1].value.strip()
         description = self.children[4].value.strip() if self.children[4].value else "No description."
@@ -144,8 +141,9 @@ class CreateCommandModal(Modal):
             command_data["random_choice"] = random_choice
         
         # Add to private commands
-        custom_commands[user_id][category].append(command_data)
-        save_commands(custom_commands)
+        cmds[category].add(command_data)
+        get_template(command_output)  # Compile the output once, up front
+        save_commands(custom_commands, user_id)
         logger.info(f"User {interaction.user} created command: {command_name} in category: {category}")
         await interaction.response.send_message(
             f"Custom command `{'cc!' if category == 'private' else 'pc!'}{command_name}` created successfully.",
@@ -244,24 +242,24 @@ class EditCommandModal(Modal):
             return
 
         # Update the command in the correct category
-        cmds = custom_commands.get(user_id, {})
-        commands_list = cmds.get(self.category, [])
-        for cmd in commands_list:
-            if cmd["name"] == self.command['name']:
-                cmd['output'] = command_output
-                cmd['description'] = description
-                cmd['edited_at'] = datetime.utcnow().isoformat()
-                if random_number:
-                    cmd['random_number'] = random_number
-                else:
-                    cmd.pop('random_number', None)
-                if random_choice:
-                    cmd['random_choice'] = random_choice
-                else:
-                    cmd.pop('random_choice', None)
-                break
+        cmd = user_commands(custom_commands, user_id)[self.category].get(self.command['name'])
+        if cmd:
+            if cmd['output'] != command_output:
+                invalidate_template(cmd['output'])
+                get_template(command_output)
+            cmd['output'] = command_output
+            cmd['description'] = description
+            cmd['edited_at'] = datetime.utcnow().isoformat()
+            if random_number:
+                cmd['random_number'] = random_number
+            else:
+                cmd.pop('random_number', None)
+            if random_choice:
+                cmd['random_choice'] = random_choice
+            else:
+                cmd.pop('random_choice', None)
 
-        save_commands(custom_commands)
+        save_commands(custom_commands, user_id)
         logger.info(f"User {interaction.user} edited command: {self.command['name']} in category: {self.category}")
         await interaction.response.send_message(
             f"Custom command `{'cc!' if self.category=='private' else 'pc!'}{self.command['name']}` has been updated.",
@@ -293,10 +291,10 @@ class ConfirmDeleteModal(Modal):
 
         # Delete the command from the correct category
         custom_commands = self.bot.custom_commands
-        cmds = custom_commands.get(self.user_id, {})
-        commands_list = cmds.get(self.category, [])
-        cmds[self.category] = [cmd for cmd in commands_list if cmd['name'] != self.command['name']]
-        save_commands(custom_commands)
+        removed = user_commands(custom_commands, self.user_id)[self.category].remove(self.command['name'])
+        if removed:
+            invalidate_template(removed['output'])
+        save_commands(custom_commands, self.user_id)
         logger.info(f"User {interaction.user} deleted command: {self.command['name']} from category: {self.category}")
         await interaction.response.send_message(
             f"Custom command `{'cc!' if self.category=='private' else 'pc!'}{self.command['name']}` has been deleted.",
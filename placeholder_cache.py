@@ -0,0 +1,117 @@
+# placeholder_cache.py
+
+import logging
+from collections import OrderedDict
+from config import MEMBER_CACHE_SIZE, MEMBER_CACHE_STATS_EVERY
+
+logger = logging.getLogger('CustomCommandBot')
+
+class GuildPlaceholderCache:
+    """
+    Formatted server placeholder values per guild. EventsCog drops entries
+    when the gateway reports a change to the guild, its members or its
+    boosts, so each value is formatted once per change instead of once per
+    render.
+    """
+
+    def __init__(self):
+        self._values = {}  # guild_id -> {placeholder: value}
+
+    def resolve(self, guild_id, placeholder, compute):
+        values = self._values.setdefault(guild_id, {})
+        value = values.get(placeholder)
+        if value is None:
+            value = values[placeholder] = compute()
+        return value
+
+    def invalidate(self, guild_id, *placeholders):
+        """
+        Drops the given placeholders of a guild, or all of them if none are given.
+        """
+        if not placeholders:
+            self._values.pop(guild_id, None)
+            return
+        values = self._values.get(guild_id)
+        if values:
+            for placeholder in placeholders:
+                values.pop(placeholder, None)
+
+guild_values = GuildPlaceholderCache()
+
+class MemberPlaceholderCache:
+    """
+    Formatted user placeholder values per (guild_id, user_id), in least
+    recently used order and bounded to ``max_entries`` members. EventsCog
+    drops a member's entry when the gateway reports a change to the member
+    or the user, and a guild's entries when its roles change.
+    """
+
+    def __init__(self, max_entries, stats_every=0):
+        self.max_entries = max_entries
+        self.stats_every = stats_every  # Log stats every this many lookups; 0 disables
+        self._entries = OrderedDict()  # (guild_id, user_id) -> {placeholder: value}
+        self._guilds_by_user = {}  # user_id -> set of guild_ids with an entry
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def resolve(self, guild_id, user_id, placeholder, compute):
+        key = (guild_id, user_id)
+        values = self._entries.get(key)
+        if values is None:
+            values = self._entries[key] = {}
+            self._guilds_by_user.setdefault(user_id, set()).add(guild_id)
+            if len(self._entries) > self.max_entries:
+                self._evict_oldest()
+        else:
+            self._entries.move_to_end(key)
+        value = values.get(placeholder)
+        if value is None:
+            self.misses += 1
+            value = values[placeholder] = compute()
+        else:
+            self.hits += 1
+        if self.stats_every and (self.hits + self.misses) % self.stats_every == 0:
+            logger.info(f"Member placeholder cache stats: {self.stats()}")
+        return value
+
+    def _evict_oldest(self):
+        (guild_id, user_id), _ = self._entries.popitem(last=False)
+        self._forget(guild_id, user_id)
+        self.evictions += 1
+
+    def _forget(self, guild_id, user_id):
+        guild_ids = self._guilds_by_user.get(user_id)
+        if guild_ids is not None:
+            guild_ids.discard(guild_id)
+            if not guild_ids:
+                del self._guilds_by_user[user_id]
+
+    def invalidate_member(self, guild_id, user_id):
+        if self._entries.pop((guild_id, user_id), None) is not None:
+            self._forget(guild_id, user_id)
+
+    def invalidate_user(self, user_id):
+        """
+        Drops the entries of a user in every guild, after a user-level change.
+        """
+        for guild_id in self._guilds_by_user.pop(user_id, ()):
+            self._entries.pop((guild_id, user_id), None)
+
+    def invalidate_guild(self, guild_id):
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+            self._forget(*key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+member_values = MemberPlaceholderCache(MEMBER_CACHE_SIZE, MEMBER_CACHE_STATS_EVERY)
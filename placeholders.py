@@ -1,5 +1,213 @@
 # placeholders.py
+import logging
+import random
+from datetime import datetime
+from functools import cached_property
 from config import PLACEHOLDERS
+from placeholder_cache import guild_values, member_values
 
-# This file can be used if you plan to expand or modify placeholders dynamically
-# Currently, placeholders are defined in config.py
+logger = logging.getLogger('CustomCommandBot')
+
+# Placeholder names and descriptions are defined in config.py; this file maps
+# each of them to the function that produces its value.
+# Every resolver is called with the RenderContext of the current render and
+# returns a str.
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class RenderContext:
+    """
+    Inputs of one command render. Values that need a lookup (the invoking
+    member, their roles, the current time) are computed on first use and
+    shared by every placeholder of that render.
+    """
+
+    def __init__(self, ctx, params, command):
+        self.ctx = ctx
+        self.params = params
+        self.command = command
+
+    @cached_property
+    def member(self):
+        return self.ctx.guild.get_member(self.ctx.user.id)
+
+    @cached_property
+    def role_names(self):
+        member = self.member
+        if not member:
+            return []
+        return [role.name for role in member.roles if role.name != "@everyone"]
+
+    @cached_property
+    def now(self):
+        # One clock reading per render, so <current_date> and <current_time> agree
+        return datetime.now()
+
+# User placeholders []
+def _username(render):
+    return render.ctx.user.name
+
+def _user_id(render):
+    return str(render.ctx.user.id)
+
+def _user_mention(render):
+    return render.ctx.user.mention
+
+def _user_avatar(render):
+    return str(render.ctx.user.avatar.url) if render.ctx.user.avatar else "No Avatar"
+
+def _user_discriminator(render):
+    return render.ctx.user.discriminator
+
+def _user_created_at(render):
+    return render.ctx.user.created_at.strftime(DATETIME_FORMAT)
+
+def _user_joined_at(render):
+    member = render.member
+    if member and member.joined_at:
+        return member.joined_at.strftime(DATETIME_FORMAT)
+    return "N/A"
+
+def _user_roles(render):
+    roles = render.role_names
+    return ", ".join(roles) if roles else "None"
+
+def _user_status(render):
+    member = render.member
+    return str(member.status).title() if member else "N/A"
+
+# Server placeholders {}
+def _servername(render):
+    return render.ctx.guild.name
+
+def _server_id(render):
+    return str(render.ctx.guild.id)
+
+def _member_count(render):
+    return str(render.ctx.guild.member_count)
+
+def _server_icon(render):
+    return str(render.ctx.guild.icon.url) if render.ctx.guild.icon else "No Icon"
+
+def _server_created_at(render):
+    return render.ctx.guild.created_at.strftime(DATETIME_FORMAT)
+
+def _server_region(render):
+    # Discord has removed server regions; update or remove this placeholder as needed
+    return "N/A"
+
+def _server_owner(render):
+    owner = render.ctx.guild.owner
+    return owner.name if owner else "Unknown"
+
+def _server_boosts(render):
+    return str(render.ctx.guild.premium_subscription_count)
+
+def _server_banner(render):
+    return str(render.ctx.guild.banner.url) if render.ctx.guild.banner else "No Banner"
+
+def _server_description(render):
+    return render.ctx.guild.description if render.ctx.guild.description else "No Description"
+
+# Dynamic placeholders <>
+def _input(name):
+    def resolve(render):
+        return render.params.get(name, "")
+    return resolve
+
+def _current_time(render):
+    return render.now.strftime("%H:%M:%S")
+
+def _current_date(render):
+    return render.now.strftime("%Y-%m-%d")
+
+def _random_number(render):
+    # Use custom range if available
+    if "random_number" in render.command:
+        min_val = render.command["random_number"].get("min", 1000)
+        max_val = render.command["random_number"].get("max", 9999)
+    else:
+        min_val, max_val = 1000, 9999
+    return str(random.randint(min_val, max_val))
+
+def _random_choice(render):
+    # Use custom choices if available
+    if "random_choice" in render.command and render.command["random_choice"]:
+        choices = render.command["random_choice"]
+    else:
+        choices = ["Option1", "Option2", "Option3"]
+    return random.choice(choices)
+
+def _channel_name(render):
+    return render.ctx.channel.name
+
+def _channel_id(render):
+    return str(render.ctx.channel.id)
+
+def _message_id(render):
+    return str(render.ctx.id)
+
+RESOLVERS = {
+    "[username]": _username,
+    "[user_id]": _user_id,
+    "[user_mention]": _user_mention,
+    "[user_avatar]": _user_avatar,
+    "[user_discriminator]": _user_discriminator,
+    "[user_created_at]": _user_created_at,
+    "[user_joined_at]": _user_joined_at,
+    "[user_roles]": _user_roles,
+    "[user_status]": _user_status,
+    "{servername}": _servername,
+    "{server_id}": _server_id,
+    "{member_count}": _member_count,
+    "{server_icon}": _server_icon,
+    "{server_created_at}": _server_created_at,
+    "{server_region}": _server_region,
+    "{server_owner}": _server_owner,
+    "{server_boosts}": _server_boosts,
+    "{server_banner}": _server_banner,
+    "{server_description}": _server_description,
+    "<input1>": _input("input1"),
+    "<input2>": _input("input2"),
+    "<input3>": _input("input3"),
+    "<current_time>": _current_time,
+    "<current_date>": _current_date,
+    "<random_number>": _random_number,
+    "<random_choice>": _random_choice,
+    "<channel_name>": _channel_name,
+    "<channel_id>": _channel_id,
+    "<message_id>": _message_id,
+}
+
+# Server placeholders only depend on the guild and are cached per guild
+GUILD_PLACEHOLDERS = frozenset(PLACEHOLDERS["{}"]["placeholders"])
+# User placeholders that need formatting or a member lookup are cached per
+# member; [user_status] is left out as presence changes are not tracked
+MEMBER_PLACEHOLDERS = frozenset({
+    "[user_avatar]", "[user_created_at]", "[user_joined_at]", "[user_roles]",
+})
+
+def resolve_placeholder(placeholder, render) -> str:
+    resolver = RESOLVERS.get(placeholder)
+    if resolver is None:
+        # Documented in config.PLACEHOLDERS but without a resolver: left as is
+        return placeholder
+    if placeholder in GUILD_PLACEHOLDERS:
+        return guild_values.resolve(render.ctx.guild.id, placeholder, lambda: resolver(render))
+    if placeholder in MEMBER_PLACEHOLDERS:
+        # Commands used in DMs have no guild; they are cached under guild None
+        guild_id = render.ctx.guild.id if render.ctx.guild else None
+        return member_values.resolve(guild_id, render.ctx.user.id, placeholder, lambda: resolver(render))
+    return resolver(render)
+
+def _check_resolvers():
+    documented = {
+        placeholder
+        for group in ("[]", "{}", "<>")
+        for placeholder in PLACEHOLDERS[group]["placeholders"]
+    }
+    missing = documented - RESOLVERS.keys()
+    if missing:
+        logger.warning(f"Placeholders without a resolver: {', '.join(sorted(missing))}")
+
+_check_resolvers()
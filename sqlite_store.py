@@ -0,0 +1,113 @@
+# sqlite_store.py
+
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger('CustomCommandBot')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    owner TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (owner, scope, name)
+);
+-- Public lookups by name are served by the in-memory PublicCommandIndex
+DROP INDEX IF EXISTS idx_commands_scope_name;
+"""
+
+SCOPES = ("private", "public")
+
+class SQLiteCommandStore:
+    """
+    Stores custom commands as one row per (owner, scope, name).
+
+    The primary key doubles as the (owner, scope, name) index; lookups by
+    name go through data.public_index, so the table is only read at startup.
+    The store remembers what it last wrote for every row, so saving a user
+    only touches rows that were added, changed, reordered or removed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Writes come from the flusher thread, lookups from the event loop
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._written = {}  # owner -> {(scope, name): (position, payload)}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM commands LIMIT 1").fetchone() is None
+
+    def load_all(self):
+        """
+        Returns every command in the custom_commands layout:
+        { "user_id": { "private": [...], "public": [...] }, ... }
+        """
+        data = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner, scope, name, position, data FROM commands "
+                "ORDER BY owner, scope, position"
+            ).fetchall()
+        for owner, scope, name, position, payload in rows:
+            user_cmds = data.setdefault(owner, {"private": [], "public": []})
+            user_cmds.setdefault(scope, []).append(json.loads(payload))
+            self._written.setdefault(owner, {})[(scope, name)] = (position, payload)
+        return data
+
+    def save_user(self, owner, user_cmds):
+        """
+        Brings the rows of one user in line with ``user_cmds``, writing only the differences.
+        """
+        rows = {}
+        for scope in SCOPES:
+            for position, cmd in enumerate((user_cmds or {}).get(scope, [])):
+                rows[(scope, cmd["name"])] = (position, json.dumps(cmd, sort_keys=True))
+
+        written = self._written.get(owner, {})
+        upserts = [
+            (owner, scope, name, position, payload)
+            for (scope, name), (position, payload) in rows.items()
+            if written.get((scope, name)) != (position, payload)
+        ]
+        deletes = [(owner, scope, name) for (scope, name) in written if (scope, name) not in rows]
+        if not upserts and not deletes:
+            return
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO commands (owner, scope, name, position, data) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (owner, scope, name) DO UPDATE SET "
+                    "position = excluded.position, data = excluded.data",
+                    upserts
+                )
+                self._conn.executemany(
+                    "DELETE FROM commands WHERE owner = ? AND scope = ? AND name = ?",
+                    deletes
+                )
+        if rows:
+            self._written[owner] = rows
+        else:
+            self._written.pop(owner, None)
+        logger.info(f"Custom commands saved for user {owner}: {len(upserts)} row(s) written, {len(deletes)} removed.")
+
+    def import_commands(self, data):
+        """
+        Bulk-loads a custom_commands dict, e.g. when switching from the JSON backend.
+        """
+        for owner, user_cmds in data.items():
+            self.save_user(owner, user_cmds)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
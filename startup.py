@@ -0,0 +1,58 @@
+# startup.py
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger('CustomCommandBot')
+
+class StartupProfiler:
+    """
+    Collects timings of the startup phases (module imports, cog construction,
+    state loading) and logs them as one report.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.timings = []  # (phase, name, seconds)
+        self.reported = False
+
+    @contextmanager
+    def measure(self, phase, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((phase, name, time.perf_counter() - start))
+
+    def report(self):
+        lines = ["Startup timing report:"]
+        for phase, name, seconds in self.timings:
+            lines.append(f"  {phase:<10} {name:<32} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<10} {'process start -> now':<32} {(time.perf_counter() - self.started_at) * 1000:8.1f} ms")
+        logger.info("\n".join(lines))
+        self.reported = True
+
+profiler = StartupProfiler()
+
+class StillStarting(Exception):
+    """
+    Raised by wait_until_ready() after the user was told to try again.
+    """
+
+async def wait_until_ready(ctx, ready):
+    """
+    Holds a slash command until ``ready`` is set by a background load. Waits at
+    most config.STARTUP_COMMAND_WAIT seconds, so the interaction can still be
+    answered within Discord's 3 second deadline; after that the user is asked
+    to try again and StillStarting is raised to skip the command.
+    """
+    if ready.is_set():
+        return
+    try:
+        await asyncio.wait_for(ready.wait(), config.STARTUP_COMMAND_WAIT)
+    except asyncio.TimeoutError:
+        await ctx.respond("The bot is still starting up, please try again in a few seconds.", ephemeral=True)
+        raise StillStarting()
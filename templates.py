@@ -0,0 +1,95 @@
+# templates.py
+import re
+from collections import OrderedDict
+from config import PLACEHOLDERS, TEMPLATE_CACHE_SIZE
+
+# Segment kinds of a compiled command output
+LITERAL = 0
+PLACEHOLDER = 1  # [user], {server} and <dynamic> placeholders
+ARGUMENT = 2  # {[<arg_name>]}
+ORANGE_BANK = 3  # ob_ fields
+
+def _build_token_pattern():
+    names = [
+        placeholder
+        for group in ("[]", "{}", "<>")
+        for placeholder in PLACEHOLDERS[group]["placeholders"]
+    ]
+    # Longest first so no placeholder can shadow a longer one
+    names.sort(key=len, reverse=True)
+    return re.compile(
+        r"\{\[\<(?P<arg>\w+)\>\]\}"
+        r"|(?P<placeholder>" + "|".join(re.escape(name) for name in names) + r")"
+        r"|(?P<ob>\bob_\w+\b)"
+    )
+
+TOKEN_PATTERN = _build_token_pattern()
+
+class CompiledTemplate:
+    """
+    A command output split once into literal text, placeholder tokens,
+    argument slots and Orange Bank fields.
+    """
+    __slots__ = ("segments", "tokens", "arg_names", "ob_fields", "_format")
+
+    def __init__(self, segments):
+        self.segments = segments  # list of (kind, value)
+        # Distinct tokens in first-seen order; each is resolved once per render
+        self.tokens = list(dict.fromkeys(
+            (kind, value) for kind, value in segments if kind != LITERAL
+        ))
+        # Every argument slot in order, as the old findall() reported them
+        self.arg_names = [value for kind, value in segments if kind == ARGUMENT]
+        self.ob_fields = [value for kind, value in self.tokens if kind == ORANGE_BANK]
+        # The segments as one str.format pattern with a positional field per token
+        slots = {token: index for index, token in enumerate(self.tokens)}
+        self._format = "".join(
+            value.replace("{", "{{").replace("}", "}}") if kind == LITERAL
+            else "{%d}" % slots[(kind, value)]
+            for kind, value in segments
+        )
+
+    def render(self, values):
+        """
+        Fills the template; ``values`` holds the text of each entry of
+        ``tokens``, in the same order.
+        """
+        return self._format.format(*values)
+
+def compile_template(output: str) -> CompiledTemplate:
+    segments = []
+    position = 0
+    for match in TOKEN_PATTERN.finditer(output):
+        if match.start() > position:
+            segments.append((LITERAL, output[position:match.start()]))
+        if match.group("arg") is not None:
+            segments.append((ARGUMENT, match.group("arg")))
+        elif match.group("placeholder") is not None:
+            segments.append((PLACEHOLDER, match.group("placeholder")))
+        else:
+            segments.append((ORANGE_BANK, match.group("ob")))
+        position = match.end()
+    if position < len(output):
+        segments.append((LITERAL, output[position:]))
+    return CompiledTemplate(segments)
+
+# Compiled outputs keyed by the output text, least recently used first.
+# Editing a command changes its output and therefore its key.
+_cache = OrderedDict()
+
+def get_template(output: str) -> CompiledTemplate:
+    template = _cache.get(output)
+    if template is not None:
+        _cache.move_to_end(output)
+        return template
+    template = compile_template(output)
+    _cache[output] = template
+    if len(_cache) > TEMPLATE_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return template
+
+def invalidate_template(output: str):
+    """
+    Drops the compiled form of an output that is no longer used by a command.
+    """
+    _cache.pop(output, None)
@@ -0,0 +1,155 @@
+# tools/fake_orange_bank.py
+"""
+Offline stand-in for the Orange Bank bot. It drives OrangeBankCog through a
+fake bot, guild and #logs channel, answers every request after a random
+delay, and reports latency and whether each caller got its own reply.
+
+Run from the repository root:
+    python tools/fake_orange_bank.py --requests 50 --fields-per-render 3 --max-delay 0.5
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from cogs.orange_bank import OrangeBankCog
+
+CHANNEL_ID = 1
+_message_ids = itertools.count(1000)
+
+# Texts a render shows when Orange Bank did not answer in time
+FALLBACKS = ("No response from Orange Bank.", "Orange Bank is unavailable.")
+
+def fake_value(user_id, field):
+    return f"{field[len('ob_'):]}-{user_id}"
+
+class FakeOrangeBank:
+    """
+    Answers "talktome" requests the way Orange Bank does: a "Sure." line, the
+    uid and the requested value, or every field for ob_all. A "#feedback batch"
+    request gets one UID section per requested user.
+    """
+
+    def __init__(self, min_delay, max_delay, use_reference, drop_rate=0.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.use_reference = use_reference
+        self.drop_rate = drop_rate  # Share of requests left unanswered
+        self.requests = 0
+        self.user = SimpleNamespace(id=config.ORANGE_BANK_USER_ID, bot=True)
+
+    def reply_to(self, content):
+        lines = content.strip().split("\n")
+        field = lines[1].split()[1]
+        if field == "batch":
+            reply = ["Sure."]
+            for line in lines[2:]:
+                user_id, *fields = line.split()
+                reply.append(f"UID: {user_id}")
+                reply.extend(f"{config.ORANGE_BANK_ALL_KEYS[name].title()}: {fake_value(user_id, name)}" for name in fields)
+            return "\n".join(reply)
+        user_id = lines[2].strip()
+        if field == "ob_all":
+            values = [f"{key.title()}: {fake_value(user_id, name)}" for name, key in config.ORANGE_BANK_ALL_KEYS.items()]
+        else:
+            values = [f"{config.ORANGE_BANK_ALL_KEYS[field].title()}: {fake_value(user_id, field)}"]
+        return "\n".join(["Sure.", f"UID: {user_id}"] + values)
+
+    async def answer(self, cog, channel, request):
+        self.requests += 1
+        if random.random() < self.drop_rate:
+            return
+        await asyncio.sleep(random.uniform(self.min_delay, self.max_delay))
+        reference = SimpleNamespace(message_id=request.id) if self.use_reference else None
+        reply = SimpleNamespace(
+            id=next(_message_ids), author=self.user, channel=channel,
+            content=self.reply_to(request.content), reference=reference,
+        )
+        await cog.on_message(reply)
+
+class FakeChannel:
+    def __init__(self, orange_bank):
+        self.id = CHANNEL_ID
+        self.name = config.ORANGE_BANK_LOGS_CHANNEL
+        self.orange_bank = orange_bank
+        self.cog = None
+        self.sent = 0
+
+    async def send(self, content):
+        self.sent += 1
+        message = SimpleNamespace(id=next(_message_ids), content=content, channel=self)
+        asyncio.get_running_loop().create_task(self.orange_bank.answer(self.cog, self, message))
+        return message
+
+def make_cog(orange_bank):
+    channel = FakeChannel(orange_bank)
+    channel.guild = guild = SimpleNamespace(id=config.ORANGE_BANK_GUILD_ID, text_channels=[channel])
+    bot = SimpleNamespace(
+        get_guild=lambda guild_id: guild if guild_id == guild.id else None,
+        get_channel=lambda channel_id: channel if channel_id == channel.id else None,
+    )
+    cog = OrangeBankCog(bot)
+    channel.cog = cog
+    cog.resolve_routing()
+    return cog, channel
+
+async def run(args):
+    config.ORANGE_BANK_BATCH_REQUESTS = args.batch
+    orange_bank = FakeOrangeBank(args.min_delay, args.max_delay, not args.no_reference, args.drop_rate)
+    cog, channel = make_cog(orange_bank)
+    fields = ("ob_balance", "ob_streak", "ob_messages", "ob_inventory")
+    # One call per render, each with its own set of ob_ fields
+    user_ids = [random.randrange(10 ** 17, 10 ** 18) for _ in range(args.users or args.requests)]
+    calls = [
+        (random.choice(user_ids), random.sample(fields, args.fields_per_render))
+        for _ in range(args.requests)
+    ]
+
+    async def timed(user_id, render_fields):
+        start = time.perf_counter()
+        values = await cog.request_orange_bank_fields(user_id, render_fields)
+        return values, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(user_id, field) for user_id, field in calls))
+    elapsed = time.perf_counter() - start
+
+    wrong = [
+        (user_id, field, values.get(field))
+        for (user_id, render_fields), (values, _) in zip(calls, results)
+        for field in render_fields
+        if values.get(field) != fake_value(user_id, field) and values.get(field) not in FALLBACKS
+    ]
+    latencies = sorted(latency for _, latency in results)
+    print(f"renders: {len(calls)}  channel messages: {channel.sent}  wall time: {elapsed:.3f}s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms  max: {latencies[-1] * 1000:.1f} ms")
+    print(f"coalesced fields: {cog.coalesced}  cache: {cog.cache.stats()}")
+    print(f"circuit breaker: {cog.breaker.state}  rejected: {cog.breaker.rejected}")
+    print(f"wrong replies: {len(wrong)}")
+    for user_id, field, value in wrong[:10]:
+        print(f"  {user_id} {field}: got {value!r}")
+    return not wrong
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50, help="Number of concurrent renders")
+    parser.add_argument("--users", type=int, default=0, help="Distinct users the renders are for (default: one per render)")
+    parser.add_argument("--fields-per-render", type=int, default=1, choices=range(1, 5))
+    parser.add_argument("--min-delay", type=float, default=0.05)
+    parser.add_argument("--max-delay", type=float, default=0.5)
+    parser.add_argument("--batch", action="store_true", help="Use batch requests (ORANGE_BANK_BATCH_REQUESTS)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of requests the fake leaves unanswered")
+    parser.add_argument("--no-reference", action="store_true", help="Reply without a message reference")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main()
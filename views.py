@@ -3,6 +3,7 @@ import discord
 from discord.ui import View, Button, Select
 from modals import EditCommandModal, ConfirmDeleteModal
 from data import save_commands
+from command_index import user_commands
 import logging
 
 logger = logging.getLogger('CustomCommandBot')
@@ -32,9 +33,7 @@ class ManageCommandsView(View):
 
     def update_commands_select(self):
         # Retrieve the commands based on the current category
-        custom_commands = self.bot.custom_commands
-        cmds = custom_commands.get(self.user_id, {})
-        commands_list = cmds.get(self.current_category, [])
+        commands_list = user_commands(self.bot.custom_commands, self.user_id)[self.current_category]
 
         # Create options for the commands select menu
         options = [
@@ -100,12 +99,10 @@ class CommandSelect(Select):
     async def callback(self, interaction: discord.Interaction):
         selected_cmd_name = self.values[0]
         user_id = self.parent_view.user_id
-        custom_commands = self.parent_view.bot.custom_commands
-        cmds = custom_commands.get(user_id, {})
-        commands_list = cmds.get(self.parent_view.current_category, [])
+        commands_list = user_commands(self.parent_view.bot.custom_commands, user_id)[self.parent_view.current_category]
 
         # Find the selected command
-        command = next((cmd for cmd in commands_list if cmd['name'] == selected_cmd_name), None)
+        command = commands_list.get(selected_cmd_name)
 
         if not command:
             await interaction.response.send_message("Command not found.", ephemeral=True)